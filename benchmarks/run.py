@@ -0,0 +1,227 @@
+# maybe - see what a program does before deciding whether you really want it to happen
+#
+# Copyright (c) 2016-2017 Philipp Emanuel Weidmann <pew@worldwidemann.com>
+#
+# Nemo vir est qui mundum non reddat meliorem.
+#
+# Released under the terms of the GNU General Public License, version 3
+# (https://gnu.org/licenses/gpl.html)
+
+
+# Measures what tracing the workloads in workloads.py costs, for every combination of interception
+# mode and filter configuration: the syscalls per second the workload makes while being traced,
+# how much slower it runs than untraced, and the peak RSS of maybe itself. Each traced run happens
+# in a fresh Python process, so the peak RSS is that of a single run.
+#
+# Usage: python benchmarks/run.py [--workloads ...] [--modes ...] [--save FILE] [--compare FILE]
+#
+# Results saved with --save can be compared to later ones with --compare, which reports the
+# measurements that have become worse by more than the tolerance, and exits with status 1 if any have.
+# Absolute numbers depend on the machine, so baselines are only meaningful on the machine they have
+# been made on, which they describe.
+
+from __future__ import print_function
+
+import os
+import sys
+import json
+import shutil
+import platform
+import tempfile
+import subprocess
+from os.path import dirname, abspath, join
+from time import time
+from argparse import ArgumentParser
+from resource import getrusage, RUSAGE_SELF
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+
+from workloads import WORKLOADS  # noqa
+
+
+MODES = ["ptrace", "seccomp", "notify"]
+
+# Filter configurations, as options for maybe
+# (None stands for "allow every operation", which depends on the filters available)
+FILTERS = {
+    "all": [],
+    "delete": ["-d", "delete"],
+    "none": None,
+}
+
+DEFAULT_SIZE = 1000
+DEFAULT_TOLERANCE = 0.25
+BASELINE_PATH = join(dirname(abspath(__file__)), "baseline.json")
+
+# Measurements, and whether larger values are better
+METRICS = [
+    ("syscalls_per_second", True),
+    ("slowdown", False),
+    ("peak_rss_kb", False),
+]
+
+
+# Runs in the process started by run_traced
+def measure(mode, filters, stats, command):
+    from maybe import SYSCALL_FILTERS, STATS
+    from maybe.maybe import main
+
+    if filters == "none":
+        filter_options = ["-a"] + sorted(SYSCALL_FILTERS)
+    else:
+        filter_options = FILTERS[filters]
+    argv = ["-l", "-m", mode] + filter_options + (["--stats", "json"] if stats else []) + ["--"] + command
+
+    stdout = sys.stdout
+    sys.stdout = sys.stderr = open(os.devnull, "w")
+    start = time()
+    main(argv)
+    elapsed = time() - start
+    sys.stdout.close()
+    sys.stdout = stdout
+
+    print(json.dumps({
+        "time": elapsed,
+        "stops": sum(STATS.stops.values()),
+        # Kilobytes on Linux
+        "peak_rss_kb": getrusage(RUSAGE_SELF).ru_maxrss,
+    }))
+
+
+def run_in_directory(workload, size, function):
+    directory = tempfile.mkdtemp(prefix="maybe-benchmark-")
+    try:
+        if workload.setup is not None:
+            workload.setup(directory, size)
+        return function(directory)
+    finally:
+        shutil.rmtree(directory)
+
+
+def run_untraced(workload, size):
+    def run(directory):
+        start = time()
+        subprocess.check_call(workload.command(size), cwd=directory)
+        return time() - start
+    return run_in_directory(workload, size, run)
+
+
+def run_traced(workload, size, mode, filters, stats=False):
+    def run(directory):
+        output = subprocess.check_output([sys.executable, abspath(__file__), "--measure", mode, filters] +
+                                         (["--stats"] if stats else []) + ["--"] + workload.command(size),
+                                         cwd=directory)
+        return json.loads(output.decode("utf-8"))
+    return run_in_directory(workload, size, run)
+
+
+def benchmark(workload_names, modes, filter_names, size, repeat):
+    results = {}
+    for workload_name in workload_names:
+        workload = WORKLOADS[workload_name]
+        untraced_time = min(run_untraced(workload, size) for i in range(repeat))
+        # In ptrace mode, every syscall stops the workload twice (before and after it is executed)
+        syscalls = run_traced(workload, size, "ptrace", "none", True)["stops"] // 2
+        for mode in modes:
+            for filter_name in filter_names:
+                runs = [run_traced(workload, size, mode, filter_name) for i in range(repeat)]
+                traced_time = min(run["time"] for run in runs)
+                key = "%s/%s/%s" % (workload_name, mode, filter_name)
+                results[key] = {
+                    "syscalls_per_second": round(syscalls / traced_time),
+                    "slowdown": round(traced_time / untraced_time, 3),
+                    "peak_rss_kb": max(run["peak_rss_kb"] for run in runs),
+                }
+                print("%-30s %14.0f %10.2fx %12d" % (key, results[key]["syscalls_per_second"],
+                                                     results[key]["slowdown"], results[key]["peak_rss_kb"]))
+                sys.stdout.flush()
+    return results
+
+
+# Returns descriptions of the measurements in results that are worse than in baseline by more than tolerance
+def find_regressions(results, baseline, tolerance):
+    regressions = []
+    for key in sorted(results):
+        if key not in baseline:
+            continue
+        for metric, larger_is_better in METRICS:
+            old, new = baseline[key][metric], results[key][metric]
+            change = (new - old) / float(old) if old else 0.0
+            if (-change if larger_is_better else change) > tolerance:
+                regressions.append("%s: %s %.4g -> %.4g (%+.0f%%)" % (key, metric, old, new, change * 100))
+    return regressions
+
+
+def main(argv=sys.argv[1:]):
+    if argv[:1] == ["--measure"]:
+        separator = argv.index("--")
+        measure(argv[1], argv[2], "--stats" in argv[3:separator], argv[separator + 1:])
+        return 0
+
+    arg_parser = ArgumentParser(description="Measure the overhead of tracing synthetic workloads with maybe.")
+    arg_parser.add_argument("--workloads", nargs="+", choices=sorted(WORKLOADS), default=sorted(WORKLOADS),
+                            metavar="WORKLOAD", help="workloads to run (default: all of %s)" %
+                                                     ", ".join(sorted(WORKLOADS)))
+    arg_parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES, metavar="MODE",
+                            help="interception modes to measure (default: all of %s)" % ", ".join(MODES))
+    arg_parser.add_argument("--filters", nargs="+", choices=sorted(FILTERS), default=sorted(FILTERS),
+                            metavar="FILTERS", help="filter configurations to measure (default: all of %s)" %
+                                                    ", ".join(sorted(FILTERS)))
+    arg_parser.add_argument("--size", type=int, default=DEFAULT_SIZE,
+                            help="number of syscalls each workload makes (default: %(default)s)")
+    arg_parser.add_argument("--repeat", type=int, default=3,
+                            help="number of runs, the best of which counts (default: %(default)s)")
+    arg_parser.add_argument("--save", nargs="?", const=BASELINE_PATH, metavar="FILE",
+                            help="save the results as a baseline (default: %s)" % BASELINE_PATH)
+    arg_parser.add_argument("--compare", nargs="?", const=BASELINE_PATH, metavar="FILE",
+                            help="compare the results to a baseline (default: %s)" % BASELINE_PATH)
+    arg_parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                            help="relative change above which a measurement is reported as a regression " +
+                                 "(default: %(default)s)")
+    args = arg_parser.parse_args(argv)
+
+    baseline = None
+    if args.compare is not None:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline.get("size") != args.size:
+            print("Baseline has been made with --size %s." % baseline.get("size"))
+            return 1
+
+    print("%-30s %14s %11s %12s" % ("Workload/mode/filters", "Syscalls/s", "Slowdown", "Peak RSS (kB)"))
+    results = benchmark(args.workloads, args.modes, args.filters, args.size, args.repeat)
+
+    regressions = []
+    if baseline is not None:
+        regressions = find_regressions(results, baseline["results"], args.tolerance)
+        print()
+        if regressions:
+            print("Regressions compared to %s:" % args.compare)
+            for regression in regressions:
+                print("  " + regression)
+        else:
+            print("No regressions compared to %s." % args.compare)
+
+    if args.save is not None:
+        if baseline is not None and args.compare == args.save:
+            # Measurements that haven't been repeated are kept
+            baseline["results"].update(results)
+            results = baseline["results"]
+        with open(args.save, "w") as baseline_file:
+            json.dump({
+                "size": args.size,
+                "machine": {
+                    "system": "%s %s" % (platform.system(), platform.release()),
+                    "architecture": platform.machine(),
+                    "processors": os.sysconf("SC_NPROCESSORS_ONLN"),
+                    "python": platform.python_version(),
+                },
+                "results": results,
+            }, baseline_file, indent=2, sort_keys=True)
+            baseline_file.write("\n")
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
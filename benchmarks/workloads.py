@@ -0,0 +1,91 @@
+# maybe - see what a program does before deciding whether you really want it to happen
+#
+# Copyright (c) 2016-2017 Philipp Emanuel Weidmann <pew@worldwidemann.com>
+#
+# Nemo vir est qui mundum non reddat meliorem.
+#
+# Released under the terms of the GNU General Public License, version 3
+# (https://gnu.org/licenses/gpl.html)
+
+
+# Synthetic commands to trace, each of which stresses one part of maybe. Every workload
+# runs in a directory of its own, which its setup function (if any) prepares untraced,
+# and makes "size" times the syscalls it is named after.
+
+import os
+import sys
+from os.path import join
+from collections import namedtuple
+
+
+Workload = namedtuple("Workload", ["command", "setup"])
+
+# Depth of the directories used by the "deep_paths" workload
+PATH_DEPTH = 32
+
+
+def python_command(script):
+    return [sys.executable, "-c", script]
+
+
+def create_deep_directory(directory, size):
+    os.makedirs(join(directory, *(["d"] * PATH_DEPTH)))
+
+
+def create_tree(directory, size):
+    # Ten files per directory, ten directories per level
+    for i in range(size):
+        parent = join(directory, "tree", *[str(digit) for digit in "%d" % (i // 10)])
+        if not os.path.isdir(parent):
+            os.makedirs(parent)
+        with open(join(parent, "f%d" % (i % 10)), "w") as f:
+            f.write("x")
+
+
+WORKLOADS = {
+    # Files opened for writing (and created), which the create_write_file filter intercepts
+    "opens": Workload(lambda size: python_command(
+        "import os\n"
+        "for i in range(%d):\n"
+        "    os.close(os.open('f%%d' %% (i %% 100), os.O_WRONLY | os.O_CREAT))\n" % size), None),
+
+    # Small writes to a single file. Unless create_write_file is disabled, opening the file is prevented,
+    # and every write goes to the file descriptor returned in its place, and is intercepted and prevented.
+    "writes": Workload(lambda size: python_command(
+        "import os\n"
+        "fd = os.open('f', os.O_WRONLY | os.O_CREAT)\n"
+        "for i in range(%d):\n"
+        "    os.write(fd, b'0123456789abcdef')\n" % size), None),
+
+    # Processes created (and waited for) one after the other
+    "forks": Workload(lambda size: python_command(
+        "import os\n"
+        "for i in range(%d):\n"
+        "    pid = os.fork()\n"
+        "    if pid == 0:\n"
+        "        os._exit(0)\n"
+        "    os.waitpid(pid, 0)\n" % size), None),
+
+    # Relative paths that have to be resolved against the working directory
+    "deep_paths": Workload(lambda size: python_command(
+        "import os\n"
+        "path = os.path.join(*(['d'] * %d))\n"
+        "for i in range(%d):\n"
+        "    os.close(os.open(os.path.join(path, 'f%%d' %% (i %% 100)), os.O_WRONLY | os.O_CREAT))\n"
+        "    os.chmod(path, 0o755)\n" % (PATH_DEPTH, size)), create_deep_directory),
+
+    # Threads making syscalls at the same time
+    "threads": Workload(lambda size: python_command(
+        "import os, threading\n"
+        "def run(n):\n"
+        "    for i in range(%d):\n"
+        "        os.close(os.open('f%%d-%%d' %% (n, i %% 100), os.O_WRONLY | os.O_CREAT))\n"
+        "threads = [threading.Thread(target=run, args=(n,)) for n in range(16)]\n"
+        "for thread in threads:\n"
+        "    thread.start()\n"
+        "for thread in threads:\n"
+        "    thread.join()\n" % max(size // 16, 1)), None),
+
+    # Deletion of a large tree of files and directories
+    "rm_rf": Workload(lambda size: ["rm", "-rf", "tree"], create_tree),
+}
@@ -8,24 +8,41 @@
 # (https://gnu.org/licenses/gpl.html)
 
 
-from sys import _getframe
+from sys import _getframe, modules
+from importlib import import_module
 from collections import OrderedDict
 
-from blessings import Terminal
+# Part of the public API
+from .cache import cache_decisions  # noqa
+from .stats import STATS  # noqa
+from .filters import FILTER_MANIFEST
 
 
-T = Terminal()
+# Stands in for a blessings Terminal, which is only created (and the terminal set up)
+# once it is first used, with the styling chosen by initialize_terminal
+class LazyTerminal(object):
+    def __init__(self):
+        self._force_styling = False
+        self._terminal = None
+
+    def initialize(self, force_styling):
+        self._force_styling = force_styling
+        self._terminal = None
+
+    def __getattr__(self, name):
+        if self._terminal is None:
+            from blessings import Terminal
+            self._terminal = Terminal(force_styling=self._force_styling)
+        return getattr(self._terminal, name)
+
+
+# The global object T is imported into the context of other modules,
+# so it has to stay the same object when the styling is changed
+T = LazyTerminal()
 
 
 def initialize_terminal(style_output):
-    # This hack works around two issues:
-    # 1. The global object T is imported into the context of other modules,
-    #    so (re)assigning T here has no effect.
-    # 2. Setting T._does_styling to True does not call setupterm, resulting in
-    #    an error unless styling was already enabled anyway.
-    # Invoking the constructor manually keeps the imported references valid
-    # and calls setupterm (again) if necessary.
-    T.__init__(force_styling={
+    T.initialize({
         "yes": True,
         "no": None,
         "auto": False,
@@ -34,8 +51,9 @@ def initialize_terminal(style_output):
 
 # Use of an ordered dictionary ensures that plugin-defined filters
 # (which are registered after built-in filters) are processed last
-# and thus override all built-in filters hooking the same syscall
-SYSCALL_FILTERS = OrderedDict()
+# and thus override all built-in filters hooking the same syscall.
+# The scopes of the built-in filters are known before their modules are imported.
+SYSCALL_FILTERS = OrderedDict((filter_scope, {}) for filter_scope in FILTER_MANIFEST)
 
 
 def register_filter(syscall, filter_function, filter_scope=None):
@@ -46,3 +64,33 @@ def register_filter(syscall, filter_function, filter_scope=None):
     if filter_scope not in SYSCALL_FILTERS:
         SYSCALL_FILTERS[filter_scope] = {}
     SYSCALL_FILTERS[filter_scope][syscall] = filter_function
+
+
+# Imports the modules registering the built-in filters for filter_scopes, if they haven't been already
+def load_filters(filter_scopes):
+    for filter_scope in filter_scopes:
+        if filter_scope in FILTER_MANIFEST and FILTER_MANIFEST[filter_scope][0] not in modules:
+            # Filters registered by plugins in the same scope take precedence
+            plugin_filters = dict(SYSCALL_FILTERS[filter_scope])
+            import_module(FILTER_MANIFEST[filter_scope][0])
+            SYSCALL_FILTERS[filter_scope].update(plugin_filters)
+
+
+# Number of threads running functions passed to submit
+FILTER_THREADS = 8
+
+_executor = None
+
+
+# Runs function(*args, **kwargs) in a background thread and returns a future for its result.
+# Filters can return such a future instead of (operation, return_value) if computing the decision
+# takes a while (e.g. because files have to be read); the thread that has made the syscall stays
+# stopped until the decision is available, while the syscalls of other threads are handled as usual.
+# Note that function cannot use the process object, which only works in the thread calling the filter.
+def submit(function, *args, **kwargs):
+    global _executor
+    if _executor is None:
+        # Part of the standard library in Python 3, available as "futures" for Python 2
+        from concurrent.futures import ThreadPoolExecutor
+        _executor = ThreadPoolExecutor(FILTER_THREADS)
+    return _executor.submit(function, *args, **kwargs)
@@ -0,0 +1,116 @@
+# maybe - see what a program does before deciding whether you really want it to happen
+#
+# Copyright (c) 2016-2017 Philipp Emanuel Weidmann <pew@worldwidemann.com>
+#
+# Nemo vir est qui mundum non reddat meliorem.
+#
+# Released under the terms of the GNU General Public License, version 3
+# (https://gnu.org/licenses/gpl.html)
+
+
+from ptrace.cpu_info import CPU_X86_64, CPU_I386, CPU_ARM, CPU_POWERPC
+from ptrace.ctypes_tools import uint2int, ulong2long
+from ptrace.syscall import SYSCALL_NAMES, SYSCALL_PROTOTYPES, FILENAME_ARGUMENTS
+
+from .stats import STATS, timer
+
+
+if CPU_X86_64:
+    ARGUMENT_REGISTERS = ("rdi", "rsi", "rdx", "r10", "r8", "r9")
+elif CPU_I386:
+    ARGUMENT_REGISTERS = ("ebx", "ecx", "edx", "esi", "edi", "ebp")
+elif CPU_ARM:
+    ARGUMENT_REGISTERS = ("r0", "r1", "r2", "r3", "r4", "r5")
+elif CPU_POWERPC:
+    ARGUMENT_REGISTERS = ("gpr3", "gpr4", "gpr5", "gpr6", "gpr7", "gpr8")
+else:
+    raise NotImplementedError("Unsupported CPU architecture")
+
+# Syscalls that are too new for python-ptrace's tables
+if CPU_X86_64:
+    NEW_SYSCALL_NAMES = {292: "dup3", 296: "pwritev", 316: "renameat2"}
+elif CPU_I386:
+    NEW_SYSCALL_NAMES = {330: "dup3", 334: "pwritev", 353: "renameat2"}
+elif CPU_ARM:
+    NEW_SYSCALL_NAMES = {358: "dup3", 362: "pwritev", 382: "renameat2"}
+else:
+    NEW_SYSCALL_NAMES = {}
+# Since Linux 5.1, new syscalls have the same number on every architecture
+NEW_SYSCALL_NAMES[436] = "close_range"
+
+NEW_SYSCALL_PROTOTYPES = {
+    "close_range": ("int", (("unsigned int", "fd"), ("unsigned int", "max_fd"), ("unsigned int", "flags"))),
+}
+
+for number, name in NEW_SYSCALL_NAMES.items():
+    SYSCALL_NAMES.setdefault(number, name)
+for name, prototype in NEW_SYSCALL_PROTOTYPES.items():
+    SYSCALL_PROTOTYPES.setdefault(name, prototype)
+
+INT_TYPES = set(("int", "pid_t", "uid_t", "gid_t", "clockid_t", "socklen_t"))
+LONG_TYPES = set(("long", "size_t"))
+
+
+# Raised when an argument cannot be read from the memory of the process, because the syscall
+# has been passed an invalid pointer (which makes the kernel fail it with EFAULT)
+class BadAddress(Exception):
+    def __init__(self, address):
+        Exception.__init__(self, "bad address: 0x%x" % address)
+        self.address = address
+
+
+def register_values(regs):
+    return [getattr(regs, register) for register in ARGUMENT_REGISTERS]
+
+
+# Sequence of the arguments passed to a syscall, each of which is only decoded
+# (and, in case of a filename, read from the process's memory) when first accessed.
+# Filenames are decoded to strings, everything else to integers, signed or unsigned
+# depending on the type of the argument in the syscall's prototype. Accessing a filename
+# that cannot be read raises BadAddress, except when iterating, which yields its address instead
+# (so syscalls can still be printed and recorded).
+class SyscallArguments(object):
+    def __init__(self, process, syscall, values):
+        self._process = process
+        self._formats = SYSCALL_PROTOTYPES[syscall][1]
+        self._values = values
+        self._arguments = {}
+
+    def __len__(self):
+        return min(len(self._formats), len(self._values))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("syscall argument index out of range")
+        if index not in self._arguments:
+            if STATS.enabled:
+                start = timer()
+                self._arguments[index] = self._decode(index)
+                STATS.decoded_arguments += 1
+                STATS.decoding_time += timer() - start
+            else:
+                self._arguments[index] = self._decode(index)
+        return self._arguments[index]
+
+    def __iter__(self):
+        for index in range(len(self)):
+            try:
+                yield self[index]
+            except BadAddress as error:
+                yield error.address
+
+    def _decode(self, index):
+        argument_type, argument_name = self._formats[index]
+        value = self._values[index]
+        if argument_name in FILENAME_ARGUMENTS and argument_type.endswith("char *"):
+            return self._process.read_string(value)
+        elif argument_type in INT_TYPES:
+            return uint2int(value)
+        elif argument_type in LONG_TYPES:
+            return ulong2long(value)
+        else:
+            return value
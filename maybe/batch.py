@@ -0,0 +1,174 @@
+# maybe - see what a program does before deciding whether you really want it to happen
+#
+# Copyright (c) 2016-2017 Philipp Emanuel Weidmann <pew@worldwidemann.com>
+#
+# Nemo vir est qui mundum non reddat meliorem.
+#
+# Released under the terms of the GNU General Public License, version 3
+# (https://gnu.org/licenses/gpl.html)
+
+
+# Runs the commands listed in a manifest file under maybe's control, several at a time,
+# and reports the operations of each command as well as the files touched by more than one.
+# Every command is traced by a process of its own, so the state kept by the filters
+# (e.g. the shadow file system) is never shared between commands.
+
+from __future__ import unicode_literals, print_function
+
+import os
+import sys
+import shlex
+from argparse import ArgumentParser, Namespace
+from collections import OrderedDict
+from multiprocessing import Pool, cpu_count
+from signal import signal, SIGINT, SIG_IGN
+
+from six import PY2, StringIO, string_types
+
+from . import T, initialize_terminal
+from .maybe import add_filter_arguments, select_filters, load_plugins, load_policy, trace
+from .operations import format_operation, DEFAULT_SPILL_THRESHOLD
+
+
+# Set before the tracing processes are forked, so they don't have to be pickled
+_args = None
+_syscall_filters = None
+
+
+def read_manifest(manifest_path):
+    # One command per line, with shell-like quoting; blank lines and comments are ignored
+    commands = []
+    with open(manifest_path) as manifest_file:
+        for line in manifest_file:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                commands.append((line, shlex.split(line)))
+    return commands
+
+
+def initialize_worker():
+    # Keyboard interrupts are handled by the main process, which then kills the workers
+    # (and with them all processes they are tracing)
+    signal(SIGINT, SIG_IGN)
+    # The output of the commands would otherwise be interleaved with the report
+    null_fd = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+        os.dup2(null_fd, fd)
+    os.close(null_fd)
+
+
+def _keep_operations(args, operations, command):
+    try:
+        return list(operations)
+    finally:
+        operations.close()
+
+
+# Returns the operations the command has been prevented from performing
+# (or None if it couldn't be traced), and the messages printed while tracing it
+def trace_command(argv):
+    args = Namespace(**vars(_args))
+    args.command = argv
+    old_stdout = sys.stdout
+    sys.stdout = messages = StringIO()
+    try:
+        result = trace(args, _syscall_filters, " ".join(argv), _keep_operations)
+    finally:
+        sys.stdout = old_stdout
+    return (result if not isinstance(result, int) else None), messages.getvalue()
+
+
+# Maps paths to the commands that have touched them, for paths touched by more than one command
+def find_conflicts(results):
+    commands = OrderedDict()
+    for command, operations in results:
+        for operation in operations:
+            if isinstance(operation, string_types):
+                continue
+            for path in (operation.path, operation.target):
+                if path is not None:
+                    commands.setdefault(path, OrderedDict()).setdefault(command, []).append(operation)
+    return OrderedDict((path, path_commands) for path, path_commands in sorted(commands.items())
+                       if len(path_commands) > 1)
+
+
+def main(argv=sys.argv[1:]):
+    global _args, _syscall_filters
+
+    if PY2:
+        argv = [unicode(arg, sys.getfilesystemencoding()) for arg in argv]  # noqa
+
+    arg_parser = ArgumentParser(
+        prog="maybe-batch",
+        description=_("Run the commands listed in a manifest file (one per line) concurrently ") +
+                    _("without the ability to make changes to your system, and list the changes ") +
+                    _("each of them would have made, as well as files touched by more than one command."),
+    )
+    arg_parser.add_argument("manifest", metavar="FILE", help=_("manifest listing the commands to run"))
+    add_filter_arguments(arg_parser)
+    arg_parser.add_argument("-j", "--jobs", type=int, default=cpu_count(), metavar="COUNT",
+                            help=_("run at most %(metavar)s commands at the same time ") +
+                                 _("(default: number of CPUs, %(default)s)"))
+    arg_parser.add_argument("--style-output", choices=["yes", "no", "auto"], default="auto",
+                            help=_("colorize output using ANSI escape sequences (yes/no) ") +
+                                 _("or automatically decide based on whether stdout is a terminal (auto, default)"))
+    arg_parser.set_defaults(overlay=False, verbose=None, spill_threshold=DEFAULT_SPILL_THRESHOLD, record=None,
+                            stats=None, format="human", events=None)
+    args = arg_parser.parse_args(argv)
+
+    initialize_terminal(args.style_output)
+
+    if args.plugin is not None and not load_plugins(args.plugin):
+        return 1
+
+    if not load_policy(args.policy):
+        return 1
+
+    _syscall_filters = select_filters(args)
+    if _syscall_filters is None:
+        return 1
+    _args = args
+
+    try:
+        commands = read_manifest(args.manifest)
+    except (IOError, OSError, ValueError) as error:
+        print(T.red(_("Error reading %s: %s.") % (T.bold(args.manifest) + T.red, error)))
+        return 1
+
+    pool = Pool(max(1, args.jobs), initialize_worker)
+    try:
+        # The commands are traced in parallel, but reported in the order of the manifest
+        results = pool.map(trace_command, [command_argv for command, command_argv in commands], 1)
+        pool.close()
+    except KeyboardInterrupt:
+        print(T.yellow(_("Batch terminated by keyboard interrupt.")))
+        return 2
+    finally:
+        pool.terminate()
+        pool.join()
+
+    status = 0
+    traced_results = []
+    for (command, command_argv), (operations, messages) in zip(commands, results):
+        print(T.bold(command))
+        for message in messages.splitlines():
+            print("  " + message)
+        if operations is None:
+            status = 1
+            continue
+        for operation in operations:
+            print("  " + format_operation(operation))
+        if not operations and not messages:
+            print("  " + _("no file system operations"))
+        traced_results.append((command, operations))
+
+    conflicts = find_conflicts(traced_results)
+    if conflicts:
+        print("\n" + _("%s has detected files touched by more than one command:") % T.bold("maybe"))
+        for path, path_commands in conflicts.items():
+            print("\n  " + T.underline(path))
+            for command, operations in path_commands.items():
+                for operation in operations:
+                    print("    %s: %s" % (T.bold(command), format_operation(operation)))
+
+    return status
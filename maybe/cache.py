@@ -0,0 +1,140 @@
+# maybe - see what a program does before deciding whether you really want it to happen
+#
+# Copyright (c) 2016-2017 Philipp Emanuel Weidmann <pew@worldwidemann.com>
+#
+# Nemo vir est qui mundum non reddat meliorem.
+#
+# Released under the terms of the GNU General Public License, version 3
+# (https://gnu.org/licenses/gpl.html)
+
+
+from os import stat
+from threading import Lock
+from collections import OrderedDict
+
+from six import string_types
+
+
+# Number of decisions remembered by default
+DEFAULT_CACHE_SIZE = 4096
+
+# All caches created by cache_decisions, which have to forget about files the command has touched
+CACHES = []
+
+# Returned by DecisionCache.get for decisions that aren't cached
+MISSING = object()
+
+
+# Least recently used decisions of a filter, keyed by the files they have been made about
+class DecisionCache(object):
+    def __init__(self, max_size=DEFAULT_CACHE_SIZE):
+        self.max_size = max_size
+        self._decisions = OrderedDict()
+        # Maps paths to the keys of the decisions about them
+        self._keys = {}
+        # Filters may be called from threads running asynchronous decisions as well
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self._decisions)
+
+    def get(self, key):
+        with self._lock:
+            decision = self._decisions.pop(key, MISSING)
+            if decision is MISSING:
+                self.misses += 1
+            else:
+                # Most recently used decisions are moved to the end
+                self._decisions[key] = decision
+                self.hits += 1
+            return decision
+
+    def put(self, key, decision):
+        with self._lock:
+            self._decisions.pop(key, None)
+            self._decisions[key] = decision
+            self._keys.setdefault(key[0], set()).add(key)
+            while len(self._decisions) > self.max_size:
+                self._forget(next(iter(self._decisions)))
+                self.evictions += 1
+
+    def _forget(self, key):
+        del self._decisions[key]
+        keys = self._keys[key[0]]
+        keys.discard(key)
+        if not keys:
+            del self._keys[key[0]]
+
+    # Forgets the decisions about path and, if recursive is true, about all files below it
+    def invalidate(self, path, recursive=False):
+        with self._lock:
+            paths = [path]
+            if recursive:
+                prefix = path.rstrip("/") + "/"
+                paths += [cached_path for cached_path in self._keys if cached_path.startswith(prefix)]
+            for cached_path in paths:
+                for key in list(self._keys.get(cached_path, ())):
+                    self._forget(key)
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._decisions.clear()
+            self._keys.clear()
+
+    def stats(self):
+        return {
+            "size": len(self._decisions),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+# Returns the key identifying the contents of the file at path, or None if there is no such file
+def file_key(path, flags):
+    try:
+        status = stat(path)
+    except (IOError, OSError):
+        return None
+    return (path, status.st_dev, status.st_ino, getattr(status, "st_mtime_ns", status.st_mtime), status.st_size,
+            flags)
+
+
+# Wraps function(path, flags), which returns the decision of a filter about the file at path,
+# so that decisions are only made once as long as the file remains unchanged. Decisions about
+# files that don't exist are never cached. Can be used as a decorator.
+def cache_decisions(function, max_size=DEFAULT_CACHE_SIZE):
+    cache = DecisionCache(max_size)
+    CACHES.append(cache)
+
+    def cached_function(path, flags=0):
+        key = file_key(path, flags)
+        if key is None:
+            return function(path, flags)
+        decision = cache.get(key)
+        if decision is MISSING:
+            decision = function(path, flags)
+            cache.put(key, decision)
+        return decision
+
+    cached_function.cache = cache
+    return cached_function
+
+
+# Called for every operation prevented by a filter: The real file is left unchanged,
+# but decisions about it no longer reflect the file as the command sees it
+def invalidate_decisions(operation):
+    if not CACHES or isinstance(operation, string_types):
+        return
+    recursive = operation.kind in ("delete", "move")
+    for cache in CACHES:
+        cache.invalidate(operation.path, recursive)
+        if operation.target is not None:
+            cache.invalidate(operation.target, recursive)
@@ -0,0 +1,92 @@
+# maybe - see what a program does before deciding whether you really want it to happen
+#
+# Copyright (c) 2016-2017 Philipp Emanuel Weidmann <pew@worldwidemann.com>
+#
+# Nemo vir est qui mundum non reddat meliorem.
+#
+# Released under the terms of the GNU General Public License, version 3
+# (https://gnu.org/licenses/gpl.html)
+
+
+# Entry point of the maybe command. If the environment variable MAYBE_DAEMON
+# is set to the socket of a running maybe-daemon, the command is traced by the daemon,
+# which has everything loaded already. Therefore, this module only uses the standard library.
+
+import os
+import sys
+import json
+import struct
+import socket
+from array import array
+from signal import signal, SIGINT, SIGTERM, SIGHUP
+
+
+# Job sent to the daemon: Length of the request, the request itself (JSON),
+# and the standard streams of the client (as ancillary data)
+REQUEST_HEADER = struct.Struct("=I")
+# Sent back by the daemon: PID of the process handling the job, then its exit status
+RESPONSE = struct.Struct("=i")
+
+STANDARD_STREAMS = [0, 1, 2]
+
+
+def default_socket_path():
+    directory = os.environ.get("XDG_RUNTIME_DIR") or "/tmp"
+    return os.path.join(directory, "maybe-%d.sock" % os.getuid())
+
+
+def receive(connection, size):
+    data = b""
+    while len(data) < size:
+        chunk = connection.recv(size - len(data))
+        if not chunk:
+            raise EOFError("connection closed by maybe-daemon")
+        data += chunk
+    return data
+
+
+def run_remotely(connection, argv):
+    # The umask can only be read by setting it
+    umask = os.umask(0)
+    os.umask(umask)
+    request = json.dumps({
+        "argv": argv,
+        "cwd": os.getcwd(),
+        "environment": dict(os.environ),
+        "umask": umask,
+    }).encode("utf-8")
+    connection.sendmsg([REQUEST_HEADER.pack(len(request)), request],
+                       [(socket.SOL_SOCKET, socket.SCM_RIGHTS, array("i", STANDARD_STREAMS))])
+
+    try:
+        worker_pid = RESPONSE.unpack(receive(connection, RESPONSE.size))[0]
+
+        # The traced command is not in the terminal's foreground process group,
+        # so signals from the terminal have to be passed on
+        def forward_signal(signum, frame):
+            os.kill(worker_pid, signum)
+        for signum in (SIGINT, SIGTERM, SIGHUP):
+            signal(signum, forward_signal)
+
+        return RESPONSE.unpack(receive(connection, RESPONSE.size))[0]
+    except EOFError as error:
+        sys.stderr.write("maybe: %s\n" % error)
+        return 1
+    finally:
+        connection.close()
+
+
+def main(argv=sys.argv[1:]):
+    socket_path = os.environ.get("MAYBE_DAEMON")
+    if socket_path and hasattr(socket.socket, "sendmsg"):
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            connection.connect(socket_path)
+        except (IOError, OSError):
+            # Daemon is not running, so the command is traced here after all
+            connection.close()
+        else:
+            return run_remotely(connection, argv)
+
+    from .maybe import main as maybe_main
+    return maybe_main(argv)
@@ -0,0 +1,139 @@
+# maybe - see what a program does before deciding whether you really want it to happen
+#
+# Copyright (c) 2016-2017 Philipp Emanuel Weidmann <pew@worldwidemann.com>
+#
+# Nemo vir est qui mundum non reddat meliorem.
+#
+# Released under the terms of the GNU General Public License, version 3
+# (https://gnu.org/licenses/gpl.html)
+
+
+# Long-running process that traces commands on behalf of the maybe command (see client.py).
+# Starting maybe is dominated by importing python-ptrace, blessings and the filters;
+# the daemon does this once, and then forks a worker for each command, which inherits
+# everything already loaded and runs the command as if maybe had been started by the client.
+
+from __future__ import print_function
+
+import os
+import sys
+import json
+import socket
+from array import array
+from argparse import ArgumentParser
+from signal import signal, SIGCHLD, SIG_IGN, SIG_DFL
+
+from . import T, initialize_terminal, load_filters
+from .filters import FILTER_MANIFEST
+from .maybe import main as maybe_main, load_plugins
+from .client import REQUEST_HEADER, RESPONSE, STANDARD_STREAMS, default_socket_path, receive
+
+
+def receive_request(connection):
+    fds = array("i")
+    header, ancillary_data, flags, address = connection.recvmsg(
+        REQUEST_HEADER.size, socket.CMSG_LEN(len(STANDARD_STREAMS) * fds.itemsize))
+    for level, message_type, message_data in ancillary_data:
+        if level == socket.SOL_SOCKET and message_type == socket.SCM_RIGHTS:
+            fds.frombytes(message_data[:len(message_data) - (len(message_data) % fds.itemsize)])
+    if len(header) < REQUEST_HEADER.size:
+        header += receive(connection, REQUEST_HEADER.size - len(header))
+    request = receive(connection, REQUEST_HEADER.unpack(header)[0])
+    return json.loads(request.decode("utf-8")), list(fds)
+
+
+def run_job(connection):
+    request, fds = receive_request(connection)
+    if len(fds) != len(STANDARD_STREAMS):
+        return 1
+
+    # The command is run with the client's standard streams, working directory, environment and umask
+    sys.stdout.flush()
+    sys.stderr.flush()
+    for fd, standard_stream in zip(fds, STANDARD_STREAMS):
+        os.dup2(fd, standard_stream)
+        os.close(fd)
+    os.chdir(request["cwd"])
+    os.environ.clear()
+    os.environ.update(request["environment"])
+    os.umask(request["umask"])
+
+    connection.sendall(RESPONSE.pack(os.getpid()))
+    try:
+        return maybe_main(request["argv"]) or 0
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+
+# Imports everything that is otherwise only imported once it is needed (by maybe's main),
+# so workers don't have to import it again for every command
+def preload():
+    load_filters(FILTER_MANIFEST)
+    from . import tracer, registers, seccomp, notify, events  # noqa
+    # Creates the blessings Terminal
+    T.normal
+
+
+def serve(server):
+    while True:
+        connection = server.accept()[0]
+        if os.fork():
+            connection.close()
+            continue
+
+        # Worker
+        server.close()
+        signal(SIGCHLD, SIG_DFL)
+        # Keeps signals meant for the daemon away from the command
+        os.setsid()
+        status = 1
+        try:
+            status = run_job(connection)
+            connection.sendall(RESPONSE.pack(status))
+        except Exception as error:
+            print("maybe-daemon: %s" % error, file=sys.stderr)
+        finally:
+            os._exit(status)
+
+
+def main(argv=sys.argv[1:]):
+    arg_parser = ArgumentParser(
+        prog="maybe-daemon",
+        description=_("Keep maybe loaded and trace commands for the maybe command, ") +
+                    _("which uses the daemon if the environment variable MAYBE_DAEMON ") +
+                    _("is set to the daemon's socket."),
+    )
+    arg_parser.add_argument("socket", nargs="?", default=default_socket_path(),
+                            help=_("path of the socket to listen on (default: %(default)s)"))
+    arg_parser.add_argument("-p", "--plugin", nargs="+", metavar="FILE",
+                            help=_("load the specified plugin script(s) once for all commands"))
+    args = arg_parser.parse_args(argv)
+
+    initialize_terminal("auto")
+    preload()
+    if args.plugin is not None and not load_plugins(args.plugin):
+        return 1
+
+    if os.path.exists(args.socket):
+        # Left behind by a daemon that has been killed
+        os.unlink(args.socket)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    # Anyone who can connect to the socket can run commands as the user running the daemon
+    old_umask = os.umask(0o077)
+    try:
+        server.bind(args.socket)
+    finally:
+        os.umask(old_umask)
+    server.listen(16)
+
+    # Workers are never waited for
+    signal(SIGCHLD, SIG_IGN)
+    try:
+        serve(server)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        os.unlink(args.socket)
+    return 0
@@ -0,0 +1,152 @@
+# maybe - see what a program does before deciding whether you really want it to happen
+#
+# Copyright (c) 2016-2017 Philipp Emanuel Weidmann <pew@worldwidemann.com>
+#
+# Nemo vir est qui mundum non reddat meliorem.
+#
+# Released under the terms of the GNU General Public License, version 3
+# (https://gnu.org/licenses/gpl.html)
+
+
+# Output written while the command is running (syscalls printed with --verbose, and the NDJSON
+# events streamed with --format json and --events). Lines are handed to a background thread,
+# which writes them in batches, so threads of the command aren't kept stopped while the output
+# (e.g. a terminal) catches up. The queue is bounded, so the command is slowed down to the speed
+# of the output rather than maybe's memory growing without limit.
+
+import sys
+import json
+from time import time
+from threading import Thread
+
+from six import string_types
+from six.moves.queue import Queue, Empty
+
+from . import T
+
+
+# Maximum number of lines waiting to be written
+QUEUE_SIZE = 4096
+# Maximum number of lines written at once
+BATCH_SIZE = 256
+
+
+def operation_dict(operation):
+    if isinstance(operation, string_types):
+        # Returned by a plugin filter
+        return {"description": operation}
+    result = {"kind": operation.kind, "path": operation.path}
+    for attribute in ("target", "byte_count", "mode", "owner", "group"):
+        if getattr(operation, attribute) is not None:
+            result[attribute] = getattr(operation, attribute)
+    return result
+
+
+class Writer(object):
+    def __init__(self, output_file, close_file=False):
+        self._file = output_file
+        self._close_file = close_file
+        self._queue = Queue(QUEUE_SIZE)
+        # Error that has stopped the writer from writing (the queue keeps being emptied)
+        self.error = None
+        self._thread = Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    # Writes line, or event as JSON
+    def write(self, item):
+        self._queue.put(item)
+
+    def _run(self):
+        while True:
+            items = [self._queue.get()]
+            while len(items) < BATCH_SIZE and items[-1] is not None:
+                try:
+                    items.append(self._queue.get_nowait())
+                except Empty:
+                    break
+            if self.error is None:
+                try:
+                    self._file.write("".join((item if isinstance(item, string_types)
+                                              else json.dumps(item, sort_keys=True)) + "\n"
+                                             for item in items if item is not None))
+                    self._file.flush()
+                except (IOError, OSError, ValueError) as error:
+                    self.error = error
+            if items[-1] is None:
+                return
+
+    # Waits until everything has been written, and returns the error that has stopped the writer (if any)
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        if self._close_file:
+            try:
+                self._file.close()
+            except (IOError, OSError) as error:
+                self.error = self.error or error
+        return self.error
+
+
+class Events(object):
+    def __init__(self):
+        self._output = None
+        self._events = None
+        self._json = False
+        self._verbose = None
+        # Whether syscalls are streamed as events
+        self.active = False
+        # Error that has caused output to be lost
+        self.error = None
+
+    # Raises IOError or OSError if the events file cannot be opened
+    def open(self, output_format, events_path, verbose):
+        self._json = output_format == "json"
+        self._verbose = verbose
+        self.error = None
+        if events_path is not None:
+            self._events = Writer(open(events_path, "w"), True)
+        if verbose or self._json:
+            self._output = Writer(sys.stdout)
+        self.active = self._json or self._events is not None
+
+    def close(self):
+        for writer in (self._output, self._events):
+            if writer is not None:
+                error = writer.close()
+                self.error = self.error or error
+        self._output = self._events = None
+        self.active = False
+
+    def syscall(self, pid, syscall, arguments, operation, return_value):
+        if not self.active:
+            # Only opened for --verbose
+            return
+        event = {
+            "event": "intercepted" if return_value is None else "prevented",
+            "time": time(),
+            "pid": pid,
+            "syscall": syscall,
+            "arguments": list(arguments),
+            "return_value": return_value,
+            "operation": operation_dict(operation) if operation is not None else None,
+        }
+        if self._json:
+            self._output.write(event)
+        if self._events is not None:
+            self._events.write(event)
+
+    # Prints a syscall (formatted like strace does) for --verbose
+    def verbose(self, pid, text, filtered):
+        if self._json:
+            self._output.write({"event": "syscall", "time": time(), "pid": pid, "call": text, "filtered": filtered})
+            return
+        # With -vv, filtered syscalls are highlighted among all others
+        line = T.bold(text) if filtered and self._verbose == 2 else text
+        if self._output is not None:
+            self._output.write(line)
+        else:
+            print(line)
+
+
+EVENTS = Events()
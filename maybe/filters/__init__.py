@@ -0,0 +1,26 @@
+# maybe - see what a program does before deciding whether you really want it to happen
+#
+# Copyright (c) 2016-2017 Philipp Emanuel Weidmann <pew@worldwidemann.com>
+#
+# Nemo vir est qui mundum non reddat meliorem.
+#
+# Released under the terms of the GNU General Public License, version 3
+# (https://gnu.org/licenses/gpl.html)
+
+
+from collections import OrderedDict
+
+
+# Maps the scopes of the built-in filters to the modules registering them, and the syscalls
+# they register filters for. Only the modules for the scopes that are enabled are imported.
+FILTER_MANIFEST = OrderedDict([
+    ("delete", ("maybe.filters.delete", ["unlink", "unlinkat", "rmdir"])),
+    ("move", ("maybe.filters.move", ["rename", "renameat", "renameat2"])),
+    ("change_permissions", ("maybe.filters.change_permissions", ["chmod", "fchmod", "fchmodat"])),
+    ("change_owner", ("maybe.filters.change_owner", ["chown", "fchown", "lchown", "fchownat"])),
+    ("create_directory", ("maybe.filters.create_directory", ["mkdir", "mkdirat"])),
+    ("create_link", ("maybe.filters.create_link", ["link", "linkat", "symlink", "symlinkat"])),
+    ("create_write_file", ("maybe.filters.create_write_file", ["open", "creat", "openat", "mknod", "mknodat",
+                                                               "write", "pwrite", "pwrite64", "writev", "pwritev",
+                                                               "dup", "dup2", "dup3", "fcntl", "close"])),
+])
@@ -8,23 +8,15 @@
 # (https://gnu.org/licenses/gpl.html)
 
 
-from pwd import getpwuid
-from grp import getgrgid
-
-from maybe import T, register_filter
+from maybe import register_filter
+from maybe.operations import Operation
+from maybe.policy import permits
 
 
 def filter_change_owner(path, owner, group):
-    if owner == -1:
-        label = "change group"
-        owner = getgrgid(group)[0]
-    elif group == -1:
-        label = "change owner"
-        owner = getpwuid(owner)[0]
-    else:
-        label = "change owner"
-        owner = getpwuid(owner)[0] + ":" + getgrgid(group)[0]
-    return "%s of %s to %s" % (T.yellow(label), T.underline(path), T.bold(owner)), 0
+    if permits("change_owner", path):
+        return None, None
+    return Operation("change_owner", path, owner=owner, group=group), 0
 
 
 register_filter("chown", lambda process, args:
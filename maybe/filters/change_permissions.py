@@ -8,21 +8,15 @@
 # (https://gnu.org/licenses/gpl.html)
 
 
-from maybe import T, register_filter
-
-
-def format_permissions(permissions):
-    result = ""
-    for i in range(2, -1, -1):
-        result += "r" if permissions & (4 * 8**i) else "-"
-        result += "w" if permissions & (2 * 8**i) else "-"
-        result += "x" if permissions & (1 * 8**i) else "-"
-    return result
+from maybe import register_filter
+from maybe.operations import Operation
+from maybe.policy import permits
 
 
 def filter_change_permissions(path, permissions):
-    return "%s of %s to %s" % (T.yellow("change permissions"), T.underline(path),
-                               T.bold(format_permissions(permissions))), 0
+    if permits("change_permissions", path):
+        return None, None
+    return Operation("change_permissions", path, mode=permissions), 0
 
 
 register_filter("chmod", lambda process, args:
@@ -8,11 +8,15 @@
 # (https://gnu.org/licenses/gpl.html)
 
 
-from maybe import T, register_filter
+from maybe import register_filter
+from maybe.operations import Operation
+from maybe.policy import permits
 
 
 def filter_create_directory(path):
-    return "%s %s" % (T.cyan("create directory"), T.underline(path)), 0
+    if permits("create_directory", path):
+        return None, None
+    return Operation("create_directory", path), 0
 
 
 register_filter("mkdir", lambda process, args:
@@ -8,12 +8,17 @@
 # (https://gnu.org/licenses/gpl.html)
 
 
-from maybe import T, register_filter
+from maybe import register_filter
+from maybe.operations import Operation
+from maybe.policy import permits
 
 
-def filter_create_link(path_source, path_target, symbolic):
-    label = "create symbolic link" if symbolic else "create hard link"
-    return "%s from %s to %s" % (T.cyan(label), T.underline(path_source), T.underline(path_target)), 0
+def filter_create_link(path_source, path_target, symbolic, content=None):
+    if permits("create_link", path_source):
+        return None, None
+    # content is what a symbolic link contains, i.e. the path of its target as given
+    kind = "create_symbolic_link" if symbolic else "create_hard_link"
+    return Operation(kind, path_source, path_target, content=content), 0
 
 
 register_filter("link", lambda process, args:
@@ -21,6 +26,6 @@ register_filter("link", lambda process, args:
 register_filter("linkat", lambda process, args:
                 filter_create_link(process.full_path(args[3], args[2]), process.full_path(args[1], args[0]), False))
 register_filter("symlink", lambda process, args:
-                filter_create_link(process.full_path(args[1]), process.full_path(args[0]), True))
+                filter_create_link(process.full_path(args[1]), process.full_path(args[0]), True, args[0]))
 register_filter("symlinkat", lambda process, args:
-                filter_create_link(process.full_path(args[2], args[1]), process.full_path(args[0]), True))
+                filter_create_link(process.full_path(args[2], args[1]), process.full_path(args[0]), True, args[0]))
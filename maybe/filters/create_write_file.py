@@ -8,81 +8,131 @@
 # (https://gnu.org/licenses/gpl.html)
 
 
-from os.path import exists
-from os import O_WRONLY, O_RDWR, O_APPEND, O_CREAT, O_TRUNC
+from os import O_WRONLY, O_RDWR, O_APPEND, O_CREAT, O_EXCL, O_TRUNC
+from errno import EEXIST
+from fcntl import F_DUPFD
 from stat import S_IFCHR, S_IFBLK, S_IFIFO, S_IFSOCK
 
-from maybe import T, register_filter
+from maybe import register_filter
+from maybe.process import O_CLOEXEC, F_DUPFD_CLOEXEC
+from maybe.operations import Operation
+from maybe.overlay import OVERLAY
+from maybe.shadow import FILESYSTEM
+from maybe.policy import POLICY, permits
 
 
 allowed_files = set(["/dev/null", "/dev/zero", "/dev/tty"])
 
 
-def filter_open(process, path, flags):
+def filter_open(process, path, flags, path_argument):
     if path in allowed_files:
         return None, None
-    if (flags & O_CREAT) and not exists(path):
-        operation = "%s %s" % (T.cyan("create file"), T.underline(path))
-    elif (flags & O_TRUNC) and exists(path):
-        operation = "%s %s" % (T.red("truncate file"), T.underline(path))
+    if POLICY.allows("create_write_file", path):
+        # Unlike most syscalls, open doesn't necessarily change anything
+        if flags & O_CREAT:
+            FILESYSTEM.forget(path)
+        return None, None
+    exists = process.file_exists(path) if flags & (O_CREAT | O_TRUNC) else None
+    if (flags & O_CREAT) and (flags & O_EXCL) and exists:
+        return None, -EEXIST
+    if (flags & O_CREAT) and not exists:
+        operation = Operation("create_file", path)
+    elif (flags & O_TRUNC) and exists:
+        operation = Operation("truncate_file", path)
     else:
         operation = None
-    if (flags & O_WRONLY) or (flags & O_RDWR) or (flags & O_APPEND) or (operation is not None):
+    writing = (flags & O_WRONLY) or (flags & O_RDWR) or (flags & O_APPEND) or (operation is not None)
+    if OVERLAY.active:
+        # Let the process open the file in the overlay instead, if there is (or is about to be) one
+        content = OVERLAY.open_for_writing(path, flags & O_TRUNC) if writing else OVERLAY.file(path)
+        if content is not None:
+            process.replace_path_argument(path_argument, content)
+        if operation is not None:
+            operation.content = content
+        return_value = None
+    elif writing:
         # File might be written to later, so we need to track the file descriptor
-        return_value = process.register_path(path)
+        return_value = process.register_path(path, close_on_exec=bool(flags & O_CLOEXEC))
     else:
         return_value = None
     return operation, return_value
 
 
-def filter_mknod(path, type):
-    if exists(path):
+def filter_mknod(process, path, type):
+    if permits("create_write_file", path):
         return None, None
+    if process.file_exists(path):
+        # The file might only exist because its creation has been prevented
+        return None, -EEXIST
     elif (type & S_IFCHR):
-        label = "create character special file"
+        kind = "create_character_special_file"
     elif (type & S_IFBLK):
-        label = "create block special file"
+        kind = "create_block_special_file"
     elif (type & S_IFIFO):
-        label = "create named pipe"
+        kind = "create_named_pipe"
     elif (type & S_IFSOCK):
-        label = "create socket"
+        kind = "create_socket"
     else:
         # mknod(2): "Zero file type is equivalent to type S_IFREG"
-        label = "create file"
-    return "%s %s" % (T.cyan(label), T.underline(path)), 0
+        kind = "create_file"
+    return Operation(kind, path), 0
 
 
 def filter_write(process, file_descriptor, byte_count):
     if process.is_tracked_descriptor(file_descriptor):
         path = process.descriptor_path(file_descriptor)
-        return "%s %s to %s" % (T.red("write"), T.bold("%d bytes" % byte_count), T.underline(path)), byte_count
+        if OVERLAY.active:
+            # Data is written to the file in the overlay
+            return Operation("write", path, byte_count=byte_count, content=OVERLAY.file(path)), None
+        return Operation("write", path, byte_count=byte_count), byte_count
     else:
         return None, None
 
 
-def filter_dup(process, file_descriptor_old, file_descriptor_new=None):
-    if process.is_tracked_descriptor(file_descriptor_old):
+def filter_dup(process, file_descriptor_old, file_descriptor_new=None, close_on_exec=False):
+    # In overlay mode, tracked file descriptors are real ones
+    if process.is_tracked_descriptor(file_descriptor_old) and not OVERLAY.active:
         # Copy tracked file descriptor
-        return None, process.register_path(process.descriptor_path(file_descriptor_old), file_descriptor_new)
+        return None, process.register_path(process.descriptor_path(file_descriptor_old),
+                                           file_descriptor_new, close_on_exec)
+    else:
+        return None, None
+
+
+def filter_fcntl(process, file_descriptor, command):
+    if command in (F_DUPFD, F_DUPFD_CLOEXEC):
+        return filter_dup(process, file_descriptor, close_on_exec=(command == F_DUPFD_CLOEXEC))
+    else:
+        return None, None
+
+
+def filter_close(process, file_descriptor):
+    if process.is_fake_descriptor(file_descriptor):
+        # The kernel doesn't know about this file descriptor, and would fail to close it
+        process.close_descriptor(file_descriptor)
+        return None, 0
     else:
         return None, None
 
 
 register_filter("open", lambda process, args:
-                filter_open(process, process.full_path(args[0]), args[1]))
+                filter_open(process, process.full_path(args[0]), args[1], 0))
 register_filter("creat", lambda process, args:
-                filter_open(process, process.full_path(args[0]), O_CREAT | O_WRONLY | O_TRUNC))
+                filter_open(process, process.full_path(args[0]), O_CREAT | O_WRONLY | O_TRUNC, 0))
 register_filter("openat", lambda process, args:
-                filter_open(process, process.full_path(args[1], args[0]), args[2]))
+                filter_open(process, process.full_path(args[1], args[0]), args[2], 1))
 register_filter("mknod", lambda process, args:
-                filter_mknod(process.full_path(args[0]), args[1]))
+                filter_mknod(process, process.full_path(args[0]), args[1]))
 register_filter("mknodat", lambda process, args:
-                filter_mknod(process.full_path(args[1], args[0]), args[2]))
+                filter_mknod(process, process.full_path(args[1], args[0]), args[2]))
 register_filter("write", lambda process, args: filter_write(process, args[0], args[2]))
 register_filter("pwrite", lambda process, args: filter_write(process, args[0], args[2]))
+register_filter("pwrite64", lambda process, args: filter_write(process, args[0], args[2]))
 # TODO: Actual byte count is iovcnt * iov.iov_len
 register_filter("writev", lambda process, args: filter_write(process, args[0], args[2]))
 register_filter("pwritev", lambda process, args: filter_write(process, args[0], args[2]))
 register_filter("dup", lambda process, args: filter_dup(process, args[0]))
 register_filter("dup2", lambda process, args: filter_dup(process, args[0], args[1]))
-register_filter("dup3", lambda process, args: filter_dup(process, args[0], args[1]))
+register_filter("dup3", lambda process, args: filter_dup(process, args[0], args[1], bool(args[2] & O_CLOEXEC)))
+register_filter("fcntl", lambda process, args: filter_fcntl(process, args[0], args[1]))
+register_filter("close", lambda process, args: filter_close(process, args[0]))
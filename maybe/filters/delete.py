@@ -8,11 +8,17 @@
 # (https://gnu.org/licenses/gpl.html)
 
 
-from maybe import T, register_filter
+from maybe import register_filter
+from maybe.operations import Operation
+from maybe.overlay import OVERLAY
+from maybe.policy import permits
 
 
 def filter_delete(path):
-    return "%s %s" % (T.red("delete"), T.underline(path)), 0
+    if permits("delete", path):
+        return None, None
+    OVERLAY.delete(path)
+    return Operation("delete", path), 0
 
 
 register_filter("unlink", lambda process, args: filter_delete(process.full_path(args[0])))
@@ -8,18 +8,17 @@
 # (https://gnu.org/licenses/gpl.html)
 
 
-from os.path import dirname, basename
-
-from maybe import T, register_filter
+from maybe import register_filter
+from maybe.operations import Operation
+from maybe.overlay import OVERLAY
+from maybe.policy import permits
 
 
 def filter_move(path_old, path_new):
-    if dirname(path_old) == dirname(path_new):
-        label = "rename"
-        path_new = basename(path_new)
-    else:
-        label = "move"
-    return "%s %s to %s" % (T.green(label), T.underline(path_old), T.underline(path_new)), 0
+    if permits("move", path_old, path_new):
+        return None, None
+    OVERLAY.move(path_old, path_new)
+    return Operation("move", path_old, path_new), 0
 
 
 register_filter("rename", lambda process, args:
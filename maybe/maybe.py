@@ -11,116 +11,361 @@
 from __future__ import unicode_literals, print_function
 
 import sys
-import subprocess
+import socket
 import gettext
 
-from imp import load_source
-from ast import literal_eval
+from os import close, kill
+from signal import SIGKILL
+from errno import EFAULT
+from threading import Event
+
 from argparse import ArgumentParser
 from logging import getLogger, NullHandler
-from os.path import splitext, basename
 
 from six import PY2
 from six.moves import input
 from ptrace.tools import locateProgram
-from ptrace.debugger import ProcessSignal, NewProcessEvent, ProcessExecution, ProcessExit
-from ptrace.debugger.child import createChild
-from ptrace.debugger.debugger import PtraceDebugger
 from ptrace.func_call import FunctionCallOptions
-from ptrace.syscall import SYSCALL_REGISTER, RETURN_VALUE_REGISTER, DIRFD_ARGUMENTS
-from ptrace.syscall.posix_constants import SYSCALL_ARG_DICT
-from ptrace.syscall.syscall_argument import ARGUMENT_CALLBACK
-
-from . import SYSCALL_FILTERS, T, initialize_terminal
-from .process import Process
-# Filter modules are imported not to use them as symbols, but to execute their top-level code
-from .filters import (delete, move, change_permissions, change_owner,    # noqa
-                      create_directory, create_link, create_write_file)  # noqa
+from ptrace.syscall import PtraceSyscall
+
+from . import SYSCALL_FILTERS, T, initialize_terminal, load_filters
+from .filters import FILTER_MANIFEST
+from .process import Process, thread_group_id, select_trackers
+from .operations import OperationLog, format_operation, DEFAULT_SPILL_THRESHOLD
+from .overlay import OVERLAY
+from .shadow import FILESYSTEM
+from .policy import POLICY
+from .stats import STATS
+from .cache import invalidate_decisions
+from .arguments import SyscallArguments, BadAddress
 
 # localization with gettext
 gettext.install('maybe', '/usr/share/locale')
 
-def parse_argument(argument):
-    # createText() uses repr() to render the argument,
-    # for which literal_eval() acts as an inverse function
-    # (see http://stackoverflow.com/a/24886425)
-    argument = literal_eval(argument.createText())
-    if PY2 and isinstance(argument, str):
-        argument = unicode(argument, sys.getfilesystemencoding())  # noqa
-    return argument
 
+def get_operations(tracer, syscall_filters, syscall_trackers, verbose, operations, outputs, seccomp=False):
+    from .registers import Registers, syscall_number
+    from .tracer import SYSCALL, SIGNAL, NEW_PROCESS, EXECUTION, EXIT
+    from .seccomp import SYSCALL_NUMBERS
+    if verbose:
+        from .events import EVENTS
 
-def get_operations(debugger, syscall_filters, verbose):
     format_options = FunctionCallOptions(
         replace_socketcall=False,
         string_max_length=4096,
     )
 
+    # Maps the numbers of filtered and tracked syscalls on this architecture to their names
+    number_syscalls = dict((SYSCALL_NUMBERS[syscall], syscall)
+                           for syscall in set(syscall_filters) | set(syscall_trackers)
+                           if syscall in SYSCALL_NUMBERS)
+
+    # Maps thread IDs to the processes the threads belong to
     processes = {}
-    operations = []
+    # Maps thread IDs to the syscalls the threads are executing, along with functions to be called
+    # with their results (if any) and the argument registers to be restored once they have been executed
+    exit_callbacks = {}
+    # Maps thread IDs to the syscalls the threads are stopped at until asynchronous filters
+    # have decided about them, along with the futures for these decisions
+    pending_decisions = {}
+    decision_completed = Event()
+
+    def resume(process, signum=0):
+        if seccomp and process.pid not in exit_callbacks:
+            # The seccomp filter stops the process again when the next filtered syscall is made
+            process.cont(signum)
+        else:
+            process.syscall(signum)
+
+    def wait_event():
+        # While decisions are pending, processes are polled for events in between checking
+        # whether decisions have become available, so the threads waiting for them can be resumed
+        pause = 0.001
+        while pending_decisions:
+            decision_completed.clear()
+            for pid in [pid for pid, pending in pending_decisions.items() if pending[4].done()]:
+                decide(*pending_decisions.pop(pid))
+            event = tracer.wait(blocking=False)
+            if event is not None:
+                return event
+            decision_completed.wait(pause)
+            pause = min(pause * 2, 0.01)
+        return tracer.wait()
+
+    def decide(process, registers, name, arguments, decision):
+        if not isinstance(decision, tuple):
+            # Future returned by an asynchronous filter (exceptions are propagated)
+            decision = decision.result()
+            # Other threads of the process might have made syscalls in the meantime
+            processes[process.pid].set_thread(process, registers)
+        operation, return_value = decision
+
+        exit_callback = None
+        if name in syscall_trackers and return_value is None:
+            try:
+                exit_callback = syscall_trackers[name](processes[process.pid], arguments)
+            except BadAddress:
+                # The syscall is going to fail
+                pass
+        if exit_callback is not None or registers.replaced:
+            exit_callbacks[process.pid] = (name, exit_callback, registers.replaced)
+
+        if operation is not None:
+            # Later filter decisions take the effects of the operation into account
+            FILESYSTEM.update(operation)
+            invalidate_decisions(operation)
+            operations.append(operation)
+
+        for output in outputs:
+            output.syscall(process.pid, name, arguments, operation, return_value)
+
+        if STATS.enabled:
+            STATS.count_decision(name, return_value)
+
+        if return_value is not None:
+            registers.prevent_syscall(return_value)
+        # All registers changed by filters and trackers are written at once
+        registers.flush()
+
+        resume(process)
+
+    def count_stop(name):
+        if STATS.enabled:
+            STATS.count_stop(name if name in syscall_filters or name in syscall_trackers else None)
+
+    def on_signal(event):
+        resume(event.thread, event.detail)
+
+    def on_new_process(event):
+        thread = event.thread
+        parent = thread.parent
+        if parent.pid not in processes:
+            processes[parent.pid] = Process(parent)
+        # Every process created by clone (without SIGCHLD as exit signal)
+        # is reported as a thread, which is not necessarily true
+        if thread.is_thread and thread_group_id(thread.pid) == thread_group_id(parent.pid):
+            processes[thread.pid] = processes[parent.pid]
+            processes[parent.pid].add_thread()
+        else:
+            processes[thread.pid] = processes[parent.pid].fork(thread)
+        resume(thread)
+        resume(parent)
+
+    def on_execution(event):
+        former_pid = event.detail
+        if former_pid != event.thread.pid and former_pid in processes:
+            # The thread has taken over the ID of the thread group leader, whose exit is not reported
+            processes.pop(former_pid).remove_thread()
+        if event.thread.pid in processes:
+            processes[event.thread.pid].execute()
+        resume(event.thread)
+
+    def on_exit(event):
+        exit_callbacks.pop(event.thread.pid, None)
+        pending_decisions.pop(event.thread.pid, None)
+        if event.thread.pid in processes:
+            # Forget the process once its last thread is gone
+            processes.pop(event.thread.pid).remove_thread()
+
+    # Events other than syscall stops
+    event_handlers = {
+        SIGNAL: on_signal,
+        NEW_PROCESS: on_new_process,
+        EXECUTION: on_execution,
+        EXIT: on_exit,
+    }
+
+    # Runs until all processes have exited
+    while tracer:
+        # This logic is mostly based on python-ptrace's "strace" example
+        event = wait_event()
+        if event.kind in event_handlers:
+            event_handlers[event.kind](event)
+            continue
 
-    while True:
-        if not debugger:
-            # All processes have exited
-            break
+        process = event.thread
+        syscall = None
+        if event.kind == SYSCALL:
+            # In seccomp mode, processes are only ever stopped by the tracer after syscalls
+            # whose results are needed, and never before them
+            if seccomp or not process.in_syscall:
+                # Syscall has already been executed
+                if process.pid in exit_callbacks:
+                    name, exit_callback, replaced = exit_callbacks.pop(process.pid)
+                    registers = Registers(process.pid)
+                    if exit_callback is not None:
+                        exit_callback(registers.return_value())
+                    if replaced:
+                        registers.restore(replaced)
+                        registers.flush()
+                    count_stop(name)
+                else:
+                    count_stop(None)
+                resume(process)
+                continue
+            if verbose == 2:
+                # Every syscall is printed, so every syscall has to be decoded anyway
+                syscall = PtraceSyscall(process, format_options)
+                syscall.enter()
+                if syscall.name not in syscall_filters and syscall.name not in syscall_trackers:
+                    EVENTS.verbose(process.pid, syscall.format(), False)
+                    count_stop(None)
+                    resume(process)
+                    continue
+        # Otherwise, a filtered syscall has stopped the process in seccomp mode
+
+        # Syscall is about to be executed
+        if syscall is None:
+            if seccomp:
+                # The syscall number and arguments are read at once (with PTRACE_GET_SYSCALL_INFO)
+                registers = Registers(process.pid)
+                number, values = registers.syscall()
+                name = number_syscalls.get(number)
+            else:
+                # Most syscalls are let through, so nothing but their number is read at first
+                name = number_syscalls.get(syscall_number(process.pid))
+                if name is not None:
+                    registers = Registers(process.pid)
+                    values = registers.arguments()
+            if name is None:
+                count_stop(None)
+                resume(process)
+                continue
+            if verbose:
+                syscall = PtraceSyscall(process, format_options)
+                syscall.enter()
+        else:
+            registers = Registers(process.pid)
+            name = syscall.name
+            values = [argument.value for argument in syscall.arguments]
+        count_stop(name)
+
+        if verbose == 2 or (verbose == 1 and name in syscall_filters):
+            EVENTS.verbose(process.pid, syscall.format(), name in syscall_filters)
+
+        if process.pid not in processes:
+            processes[process.pid] = Process(process)
+        processes[process.pid].set_thread(process, registers)
+        arguments = SyscallArguments(processes[process.pid], name, values)
+
+        if name in syscall_filters:
+            try:
+                if STATS.enabled:
+                    decision = STATS.call_filter(name, syscall_filters[name], processes[process.pid], arguments)
+                else:
+                    decision = syscall_filters[name](processes[process.pid], arguments)
+            except BadAddress:
+                # Failing the syscall like the kernel would (rather than letting it through) ensures that
+                # it cannot act on a path the process has only made readable after it has been looked at
+                decision = None, -EFAULT
+            if not isinstance(decision, tuple):
+                # The thread is resumed once the decision is available
+                decision.add_done_callback(lambda future: decision_completed.set())
+                pending_decisions[process.pid] = (process, registers, name, arguments, decision)
+                continue
+        else:
+            decision = None, None
+
+        decide(process, registers, name, arguments, decision)
 
-        # This logic is mostly based on python-ptrace's "strace" example
+    return operations
+
+
+def load_plugins(plugin_paths):
+    from .plugins import load_plugin
+
+    for plugin_path in plugin_paths:
         try:
-            syscall_event = debugger.waitSyscall()
-        except ProcessSignal as event:
-            event.process.syscall(event.signum)
-            continue
-        except NewProcessEvent as event:
-            event.process.syscall()
-            event.process.parent.syscall()
-            continue
-        except ProcessExecution as event:
-            event.process.syscall()
-            continue
-        except ProcessExit as event:
-            continue
+            load_plugin(plugin_path)
+        except Exception as error:
+            print(T.red("Error loading %s: %s." % (T.bold(plugin_path) + T.red, error)))
+            return False
+    return True
 
-        process = syscall_event.process
-        syscall_state = process.syscall_state
 
-        syscall = syscall_state.event(format_options)
+def load_policy(policy_path):
+    POLICY.clear()
+    if policy_path is not None:
+        try:
+            POLICY.load(policy_path, SYSCALL_FILTERS.keys())
+        except (IOError, OSError, ValueError) as error:
+            print(T.red("Error loading %s: %s." % (T.bold(policy_path) + T.red, error)))
+            return False
+    return True
 
-        if syscall and syscall_state.next_event == "exit":
-            # Syscall is about to be executed (just switched from "enter" to "exit")
-            if syscall.name in syscall_filters:
-                if verbose == 1:
-                    print(syscall.format())
-                elif verbose == 2:
-                    print(T.bold(syscall.format()))
 
-                filter_function = syscall_filters[syscall.name]
-                if process.pid not in processes:
-                    processes[process.pid] = Process(process)
-                arguments = [parse_argument(argument) for argument in syscall.arguments]
+# Options shared by all entry points that trace commands
+def add_filter_arguments(arg_parser):
+    arg_group = arg_parser.add_mutually_exclusive_group()
+    arg_group.add_argument("-a", "--allow", nargs="+", metavar="OPERATION",
+                           help=_("allow the command to perform the specified operation(s). ") +
+                                _("all other operations will be denied. ") +
+                                _("possible values for %(metavar)s are: ") +
+                                ", ".join(sorted(SYSCALL_FILTERS.keys())) +
+                                _("; as well as any filter scopes defined by loaded plugins"))
+    arg_group.add_argument("-d", "--deny", nargs="+", metavar="OPERATION",
+                           help=_("deny the command the specified operation(s). ") +
+                                _("all other operations will be allowed. ") +
+                                _("see --allow for a list of possible values for %(metavar)s. ") +
+                                _("--allow and --deny cannot be combined"))
+    arg_parser.add_argument("-p", "--plugin", nargs="+", metavar="FILE",
+                            help=_("load the specified plugin script(s). ") +
+                                 _("see the README for details and plugin API documentation"))
+    arg_parser.add_argument("-m", "--mode", choices=["ptrace", "seccomp", "notify"], default="ptrace",
+                            help=_("stop the command at every syscall to find the ones to intercept ") +
+                                 _("(ptrace, default), let a seccomp filter installed in the command ") +
+                                 _("stop it only at syscalls that are intercepted (seccomp, much faster), ") +
+                                 _("or have that filter forward intercepted syscalls to maybe ") +
+                                 _("without using ptrace at all (notify, fastest, requires Linux 5.8+ and Python 3)"))
+    arg_parser.add_argument("--policy", metavar="FILE",
+                            help=_("let the command perform operations on the paths allowed by the rules ") +
+                                 _("in the specified policy file. see the README for the file format"))
+
+
+# Returns the filters selected by --allow and --deny, or None if these contain unknown operations
+def select_filters(args):
+    if args.allow is not None:
+        for filter_scope in args.allow:
+            if filter_scope not in SYSCALL_FILTERS:
+                print(T.red("Unknown operation in --allow: %s." % (T.bold(filter_scope) + T.red)))
+                return None
+        filter_scopes = set(SYSCALL_FILTERS.keys()) - set(args.allow)
+    elif args.deny is not None:
+        for filter_scope in args.deny:
+            if filter_scope not in SYSCALL_FILTERS:
+                print(T.red("Unknown operation in --deny: %s." % (T.bold(filter_scope) + T.red)))
+                return None
+        filter_scopes = args.deny
+    else:
+        filter_scopes = SYSCALL_FILTERS.keys()
 
-                operation, return_value = filter_function(processes[process.pid], arguments)
+    # Only the modules of the built-in filters that are enabled are imported
+    load_filters(filter_scopes)
 
-                if operation is not None:
-                    operations.append(operation)
+    syscall_filters = {}
 
-                if return_value is not None:
-                    # Set invalid syscall number to prevent call execution
-                    process.setreg(SYSCALL_REGISTER, -1)
-                    # Substitute return value to make syscall appear to have succeeded
-                    process.setreg(RETURN_VALUE_REGISTER, return_value)
+    for filter_scope in SYSCALL_FILTERS:
+        if filter_scope in filter_scopes:
+            for syscall in SYSCALL_FILTERS[filter_scope]:
+                syscall_filters[syscall] = SYSCALL_FILTERS[filter_scope][syscall]
 
-            elif verbose == 2:
-                print(syscall.format())
+    return syscall_filters
 
-        process.syscall()
 
-    return operations
+def format_command(argv):
+    # This is basically "shlex.join"
+    return " ".join([(("'%s'" % arg) if (" " in arg) else arg) for arg in argv])
 
 
 def main(argv=sys.argv[1:]):
     if PY2:
         argv = [unicode(arg, sys.getfilesystemencoding()) for arg in argv]  # noqa
 
+    if argv[:1] == ["report"]:
+        # To run a command called "report", use "maybe -- report"
+        from .query import main as query_main
+        return query_main(argv[1:])
+
     # Insert positional argument separator, if not already present
     if "--" not in argv:
         for i, argument in enumerate(argv):
@@ -137,21 +382,27 @@ def main(argv=sys.argv[1:]):
                _("visit https://github.com/p-e-w/maybe."),
     )
     arg_parser.add_argument("command", nargs="+", help=_("the command to run under maybe's control"))
-    arg_group = arg_parser.add_mutually_exclusive_group()
-    arg_group.add_argument("-a", "--allow", nargs="+", metavar="OPERATION",
-                           help=_("allow the command to perform the specified operation(s). ") +
-                                _("all other operations will be denied. ") +
-                                _("possible values for %(metavar)s are: ") +
-                                ", ".join(sorted(SYSCALL_FILTERS.keys())) +
-                                _("; as well as any filter scopes defined by loaded plugins"))
-    arg_group.add_argument("-d", "--deny", nargs="+", metavar="OPERATION",
-                           help=_("deny the command the specified operation(s). ") +
-                                _("all other operations will be allowed. ") +
-                                _("see --allow for a list of possible values for %(metavar)s. ") +
-                                _("--allow and --deny cannot be combined"))
-    arg_parser.add_argument("-p", "--plugin", nargs="+", metavar="FILE",
-                            help=_("load the specified plugin script(s). ") +
-                                 _("see the README for details and plugin API documentation"))
+    add_filter_arguments(arg_parser)
+    arg_parser.add_argument("-o", "--overlay", action="store_true",
+                            help=_("let the command write to copies of files in a temporary directory, ") +
+                                 _("so the operations can be permitted without rerunning the command ") +
+                                 _("(not available in notify mode)"))
+    arg_parser.add_argument("--spill-threshold", type=int, default=DEFAULT_SPILL_THRESHOLD, metavar="COUNT",
+                            help=_("keep at most %(metavar)s operations in memory while the command is running, ") +
+                                 _("writing older ones to a temporary file (default: %(default)s)"))
+    arg_parser.add_argument("--record", metavar="FILE",
+                            help=_("record all intercepted syscalls to the specified file, ") +
+                                 _("which can then be queried with \"maybe report FILE\""))
+    arg_parser.add_argument("--format", choices=["human", "json"], default="human",
+                            help=_("print the output as text (human, default), or as JSON objects, one per line ") +
+                                 _("(json), streaming every intercepted syscall while the command is running, ") +
+                                 _("followed by the operations (without rerun prompt)"))
+    arg_parser.add_argument("--events", metavar="FILE",
+                            help=_("stream every intercepted syscall to the specified file while the command ") +
+                                 _("is running, as JSON objects, one per line"))
+    arg_parser.add_argument("--stats", nargs="?", choices=["human", "json"], const="human",
+                            help=_("after the command has finished, print where maybe has spent its time ") +
+                                 _("to stderr, as text (human, default) or as JSON (json)"))
     arg_parser.add_argument("-l", "--list-only", action="store_true",
                             help=_("list operations without header, indentation and rerun prompt"))
     arg_parser.add_argument("--style-output", choices=["yes", "no", "auto"], default="auto",
@@ -165,67 +416,125 @@ def main(argv=sys.argv[1:]):
 
     initialize_terminal(args.style_output)
 
-    if args.plugin is not None:
-        for plugin_path in args.plugin:
-            try:
-                module_name = splitext(basename(plugin_path))[0]
-                # Note: imp.load_source is *long* deprecated and not even documented
-                # in Python 3 anymore, but it still seems to work and the "alternatives"
-                # (see http://stackoverflow.com/a/67692) are simply too insane to use
-                load_source(module_name, plugin_path)
-            except Exception as error:
-                print(T.red("Error loading %s: %s." % (T.bold(plugin_path) + T.red, error)))
-                return 1
+    if args.plugin is not None and not load_plugins(args.plugin):
+        return 1
 
-    if args.allow is not None:
-        for filter_scope in args.allow:
-            if filter_scope not in SYSCALL_FILTERS:
-                print(T.red("Unknown operation in --allow: %s." % (T.bold(filter_scope) + T.red)))
-                return 1
-        filter_scopes = set(SYSCALL_FILTERS.keys()) - set(args.allow)
-    elif args.deny is not None:
-        for filter_scope in args.deny:
-            if filter_scope not in SYSCALL_FILTERS:
-                print(T.red("Unknown operation in --deny: %s." % (T.bold(filter_scope) + T.red)))
-                return 1
-        filter_scopes = args.deny
-    else:
-        filter_scopes = SYSCALL_FILTERS.keys()
+    if not load_policy(args.policy):
+        return 1
 
-    syscall_filters = {}
+    syscall_filters = select_filters(args)
+    if syscall_filters is None:
+        return 1
 
-    for filter_scope in SYSCALL_FILTERS:
-        if filter_scope in filter_scopes:
-            for syscall in SYSCALL_FILTERS[filter_scope]:
-                syscall_filters[syscall] = SYSCALL_FILTERS[filter_scope][syscall]
+    return trace(args, syscall_filters, format_command(args.command))
+
+
+# Runs the command, passing the operations it has been prevented from performing to handle_operations,
+# whose return value is returned
+def trace(args, syscall_filters, command, handle_operations=None):
+    if handle_operations is None:
+        handle_operations = report
+
+    # Modes read from the real file system can only be cached if every syscall
+    # changing them is filtered (see ShadowFilesystem)
+    FILESYSTEM.clear(all(syscall in syscall_filters
+                         for filter_scope in FILTER_MANIFEST for syscall in FILTER_MANIFEST[filter_scope][1]))
+    STATS.clear()
+    if args.stats is not None:
+        STATS.enabled = True
 
     # Suppress logging output from python-ptrace
     getLogger().addHandler(NullHandler())
 
-    # Prevent python-ptrace from decoding arguments to keep raw numerical values
-    DIRFD_ARGUMENTS.clear()
-    SYSCALL_ARG_DICT.clear()
-    ARGUMENT_CALLBACK.clear()
+    if args.mode == "notify" and args.overlay:
+        print(T.red(_("Overlay mode is not available in notify mode.")))
+        return 1
 
-    # This is basically "shlex.join"
-    command = " ".join([(("'%s'" % arg) if (" " in arg) else arg) for arg in args.command])
+    # The listener is passed from the command to maybe with sendmsg, which Python 2 doesn't have
+    if args.mode == "notify" and not hasattr(socket.socket, "sendmsg"):
+        print(T.red(_("Notify mode requires Python 3.")))
+        return 1
+
+    # Recordings and event streams told about every decision, whose modules are only imported if used
+    outputs = []
+    events = None
+    if args.record is not None:
+        from .record import RECORDER
+        try:
+            RECORDER.open(args.record)
+        except (IOError, OSError) as error:
+            print(T.red("Error opening %s: %s." % (T.bold(args.record) + T.red, error)))
+            return 1
+        outputs.append(RECORDER)
+    if args.verbose or args.format == "json" or args.events is not None:
+        from .events import EVENTS
+        try:
+            EVENTS.open(args.format, args.events, args.verbose)
+        except (IOError, OSError) as error:
+            close_outputs(outputs)
+            print(T.red("Error opening %s: %s." % (T.bold(args.events) + T.red, error)))
+            return 1
+        events = EVENTS
+        outputs.append(EVENTS)
+    try:
+        if args.mode == "notify":
+            status = notify_main(args, syscall_filters, command, handle_operations, outputs)
+        else:
+            if args.overlay:
+                OVERLAY.activate()
+            try:
+                status = ptrace_main(args, syscall_filters, command, handle_operations, outputs)
+            finally:
+                OVERLAY.remove()
+    finally:
+        close_outputs(outputs)
+        if args.stats == "json":
+            import json
+            print(json.dumps(STATS.as_dict(), indent=2, sort_keys=True), file=sys.stderr)
+        elif args.stats == "human":
+            print(STATS.format(), file=sys.stderr)
+
+    if events is not None and events.error is not None:
+        # Output has been lost, e.g. because the disk is full or the reader of a pipe has exited
+        print(T.red(_("Error writing output: %s.") % events.error), file=sys.stderr)
+        return status or 1
+    return status
+
+
+def close_outputs(outputs):
+    for output in outputs:
+        output.close()
+    del outputs[:]
+
+
+def ptrace_main(args, syscall_filters, command, handle_operations, outputs):
+    from .tracer import Tracer
+    from .seccomp import PTRACE_O_TRACESECCOMP, compile_filter, create_child
+
+    tracer = Tracer(PTRACE_O_TRACESECCOMP if args.mode == "seccomp" else 0)
+    syscall_trackers = select_trackers(syscall_filters)
 
     try:
         args.command[0] = locateProgram(args.command[0])
-        pid = createChild(args.command, False)
+        if args.mode == "seccomp":
+            pid = create_child(args.command, compile_filter(set(syscall_filters) | set(syscall_trackers)))
+        else:
+            pid = create_child(args.command)
+        process = tracer.add_process(pid)
     except Exception as error:
         print(T.red("Error executing %s: %s." % (T.bold(command) + T.red, error)))
         return 1
 
-    debugger = PtraceDebugger()
-    debugger.traceFork()
-    debugger.traceExec()
+    if args.mode == "seccomp":
+        process.cont()
+    else:
+        process.syscall()
 
-    process = debugger.addProcess(pid, True)
-    process.syscall()
+    STATS.start()
 
     try:
-        operations = get_operations(debugger, syscall_filters, args.verbose)
+        operations = get_operations(tracer, syscall_filters, syscall_trackers, args.verbose,
+                                    OperationLog(args.spill_threshold), outputs, args.mode == "seccomp")
     except Exception as error:
         print(T.red(_("Error tracing process: %s.") % error))
         return 1
@@ -235,24 +544,98 @@ def main(argv=sys.argv[1:]):
     finally:
         # Cut down all processes no matter what happens
         # to prevent them from doing any damage
-        debugger.quit()
+        tracer.quit()
+        # The recording is complete before the user is asked anything
+        close_outputs(outputs)
+        STATS.stop()
+
+    return handle_operations(args, operations, command)
+
+
+def notify_main(args, syscall_filters, command, handle_operations, outputs):
+    from .notify import create_notified_child, get_notified_operations
+    from .seccomp import SECCOMP_RET_USER_NOTIF, compile_filter
+
+    syscall_trackers = select_trackers(syscall_filters)
+
+    try:
+        args.command[0] = locateProgram(args.command[0])
+        program = compile_filter(set(syscall_filters) | set(syscall_trackers), SECCOMP_RET_USER_NOTIF)
+        pid, listener = create_notified_child(args.command, program)
+    except Exception as error:
+        print(T.red("Error executing %s: %s." % (T.bold(command) + T.red, error)))
+        return 1
+
+    STATS.start()
+
+    try:
+        operations = get_notified_operations(listener, pid, syscall_filters, syscall_trackers, args.verbose,
+                                             OperationLog(args.spill_threshold), outputs)
+    except Exception as error:
+        print(T.red(_("Error tracing process: %s.") % error))
+        return 1
+    except KeyboardInterrupt:
+        print(T.yellow(_("%s terminated by keyboard interrupt.") % (T.bold(command) + T.yellow)))
+        return 2
+    finally:
+        # Once the listener is closed, filtered syscalls fail instead of being executed,
+        # so processes that have escaped the kill below cannot do any damage either
+        try:
+            kill(pid, SIGKILL)
+        except OSError:
+            pass
+        close(listener)
+        close_outputs(outputs)
+        STATS.stop()
 
-    if operations:
+    return handle_operations(args, operations, command)
+
+
+def report(args, operations, command):
+    if args.format == "json":
+        import json
+        from .events import operation_dict
+        try:
+            for operation in operations:
+                print(json.dumps({"event": "operation", "operation": operation_dict(operation)}, sort_keys=True))
+        finally:
+            operations.close()
+    elif operations:
         if not args.list_only:
             print(_("%s has prevented %s from performing %d file system operations:\n") %
                   (T.bold("maybe"), T.bold(command), len(operations)))
         for operation in operations:
-            print(("" if args.list_only else "  ") + operation)
-        if not args.list_only:
-            print("\nDo you want to rerun %s and permit these operations? [y/N] " % T.bold(command), end="")
-            try:
-                choice = input()
-            except KeyboardInterrupt:
-                choice = ""
-                # Ctrl+C does not print a newline automatically
-                print("")
-            if choice.lower() == _("y"):
-                subprocess.call(args.command)
+            print(("" if args.list_only else "  ") + format_operation(operation))
+        try:
+            if not args.list_only:
+                return prompt(args, operations, command)
+        finally:
+            operations.close()
     else:
         print(_("%s has not detected any file system operations from %s.") %
               (T.bold("maybe"), T.bold(command)))
+
+
+def prompt(args, operations, command):
+    # In overlay mode, the operations can (usually) be performed without rerunning the command
+    apply = OVERLAY.active and OVERLAY.can_apply(operations)
+    if apply:
+        print("\nDo you want to permit these operations? [y/N] ", end="")
+    else:
+        print("\nDo you want to rerun %s and permit these operations? [y/N] " % T.bold(command), end="")
+    try:
+        choice = input()
+    except KeyboardInterrupt:
+        choice = ""
+        # Ctrl+C does not print a newline automatically
+        print("")
+    if choice.lower() == _("y"):
+        if apply:
+            try:
+                OVERLAY.apply(operations)
+            except (IOError, OSError) as error:
+                print(T.red(_("Error performing operations: %s.") % error))
+                return 1
+        else:
+            import subprocess
+            subprocess.call(args.command)
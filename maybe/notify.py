@@ -0,0 +1,247 @@
+# maybe - see what a program does before deciding whether you really want it to happen
+#
+# Copyright (c) 2016-2017 Philipp Emanuel Weidmann <pew@worldwidemann.com>
+#
+# Nemo vir est qui mundum non reddat meliorem.
+#
+# Released under the terms of the GNU General Public License, version 3
+# (https://gnu.org/licenses/gpl.html)
+
+
+from __future__ import print_function
+
+import pickle
+from os.path import exists
+from os import fork, execv, closerange, waitpid, _exit, WNOHANG
+from errno import EFAULT
+from array import array
+from select import poll, POLLIN
+from socket import socketpair, AF_UNIX, SOCK_DGRAM, SOL_SOCKET, SCM_RIGHTS
+from collections import namedtuple
+from ctypes import byref, c_ulong, c_uint64
+
+from ptrace.debugger import ChildError
+from ptrace.debugger.child import MAXFD
+from ptrace.syscall import SYSCALL_NAMES
+
+from .process import Process, thread_group_id, parent_process_id, start_time
+from .shadow import FILESYSTEM
+from .cache import invalidate_decisions
+from .stats import STATS
+from .arguments import SyscallArguments, BadAddress
+from .seccomp import (libc, seccomp_notif, seccomp_notif_resp, install_filter, check_executable,
+                      SECCOMP_IOCTL_NOTIF_RECV, SECCOMP_IOCTL_NOTIF_SEND, SECCOMP_IOCTL_NOTIF_ID_VALID,
+                      SECCOMP_USER_NOTIF_FLAG_CONTINUE)
+
+
+# Number of known threads above which exited ones are looked for
+PROCESS_LIMIT = 1024
+
+# Milliseconds between checks for decisions of asynchronous filters
+PENDING_POLL_INTERVAL = 5
+
+# Stands in for python-ptrace's process object, of which Process only uses the PID
+Tracee = namedtuple("Tracee", ["pid"])
+
+
+def create_notified_child(arguments, program):
+    check_executable(arguments[0])
+
+    parent_socket, child_socket = socketpair(AF_UNIX, SOCK_DGRAM)
+    pid = fork()
+
+    if pid:
+        child_socket.close()
+        data, ancillary_data, flags, address = parent_socket.recvmsg(1048576, 64)
+        parent_socket.close()
+        for level, message_type, message_data in ancillary_data:
+            if level == SOL_SOCKET and message_type == SCM_RIGHTS:
+                return pid, array("i", message_data)[0]
+        waitpid(pid, 0)
+        raise pickle.loads(data)
+
+    parent_socket.close()
+    try:
+        closerange(3, child_socket.fileno())
+        closerange(child_socket.fileno() + 1, MAXFD)
+        listener = install_filter(program, True)
+    except Exception as error:
+        child_socket.send(pickle.dumps(ChildError(str(error))))
+        _exit(255)
+    # sendmsg is never filtered, and both the socket and the listener
+    # are closed on exec, so the command won't even see them
+    child_socket.sendmsg([b"\0"], [(SOL_SOCKET, SCM_RIGHTS, array("i", [listener]))])
+    try:
+        execv(arguments[0], arguments)
+    finally:
+        _exit(255)
+
+
+def format_syscall(syscall, arguments):
+    return "%s(%s)" % (syscall, ", ".join([repr(argument) for argument in arguments]))
+
+
+def get_notified_operations(listener, pid, syscall_filters, syscall_trackers, verbose, operations, outputs):
+    if verbose:
+        from .events import EVENTS
+
+    # Maps thread IDs to the processes the threads belong to, and to the times the threads have been started at
+    processes = {}
+    start_times = {}
+    process_limit = PROCESS_LIMIT
+    # Maps the IDs of notifications to the syscalls asynchronous filters have yet to decide about,
+    # along with the futures for these decisions. Responses to notifications can be sent in any order.
+    pending_decisions = {}
+
+    poller = poll()
+    poller.register(listener, POLLIN)
+
+    # Returns whether thread_id is known, forgetting it if the thread it belonged to has exited,
+    # since its ID might have been reused by a thread of another process
+    def is_known(thread_id):
+        if thread_id not in processes:
+            return False
+        try:
+            if start_time(thread_id) == start_times[thread_id]:
+                return True
+        except (IOError, OSError):
+            pass
+        del processes[thread_id]
+        del start_times[thread_id]
+        return False
+
+    def add_thread(thread_id, process):
+        try:
+            start_times[thread_id] = start_time(thread_id)
+        except (IOError, OSError):
+            # The thread has been killed in the meantime, so it is forgotten when it is next looked up
+            start_times[thread_id] = None
+        processes[thread_id] = process
+
+    def respond(thread_id, process, syscall, arguments, decision, response):
+        if not isinstance(decision, tuple):
+            # Future returned by an asynchronous filter (exceptions are propagated)
+            decision = decision.result()
+            # Other threads of the process might have made syscalls in the meantime
+            process.set_thread(Tracee(thread_id))
+        operation, return_value = decision
+
+        if syscall in syscall_trackers and return_value is None:
+            # Results of syscalls are never seen here, so state that depends
+            # on them is looked up again when needed
+            try:
+                syscall_trackers[syscall](process, arguments)
+            except BadAddress:
+                # The syscall is going to fail
+                pass
+
+        # If the process has been killed in the meantime, its PID might already
+        # have been reused, so the filter could have looked at the wrong process
+        if libc.ioctl(listener, c_ulong(SECCOMP_IOCTL_NOTIF_ID_VALID), byref(c_uint64(response.id))) != 0:
+            return
+
+        if operation is not None:
+            # Later filter decisions take the effects of the operation into account
+            FILESYSTEM.update(operation)
+            invalidate_decisions(operation)
+            operations.append(operation)
+
+        for output in outputs:
+            output.syscall(thread_id, syscall, arguments, operation, return_value)
+
+        if STATS.enabled:
+            STATS.count_decision(syscall, return_value)
+
+        if return_value is not None:
+            # Prevent call execution and make it appear to have returned return_value
+            response.flags = 0
+            if return_value < 0:
+                response.error = return_value
+            else:
+                response.val = return_value
+
+        libc.ioctl(listener, c_ulong(SECCOMP_IOCTL_NOTIF_SEND), byref(response))
+
+    while True:
+        for notification_id in [notification_id for notification_id, pending in pending_decisions.items()
+                                if pending[4].done()]:
+            respond(*pending_decisions.pop(notification_id))
+
+        if pid is not None and waitpid(pid, WNOHANG)[0] == pid:
+            pid = None
+
+        # The kernel hangs up the listener once the last process using the filter is gone,
+        # which can only happen after the command itself has been reaped
+        # While decisions are pending, the listener is polled in between checking
+        # whether they have become available
+        events = poller.poll(PENDING_POLL_INTERVAL if pending_decisions else None if pid is None else 100)
+        if not events:
+            continue
+        if not (events[0][1] & POLLIN):
+            # All processes have exited
+            break
+
+        notification = seccomp_notif()
+        if libc.ioctl(listener, c_ulong(SECCOMP_IOCTL_NOTIF_RECV), byref(notification)) != 0:
+            # The process was interrupted by a signal or killed before the notification could be received
+            continue
+
+        response = seccomp_notif_resp(id=notification.id, flags=SECCOMP_USER_NOTIF_FLAG_CONTINUE)
+        syscall = SYSCALL_NAMES.get(notification.data.nr)
+        if STATS.enabled:
+            STATS.count_stop(syscall if syscall in syscall_filters or syscall in syscall_trackers else None)
+
+        if syscall in syscall_filters or syscall in syscall_trackers:
+            if not is_known(notification.pid):
+                if len(processes) >= process_limit:
+                    # Exits are not reported here, so processes whose threads
+                    # have all disappeared are only forgotten from time to time
+                    for thread_id in [tid for tid in processes if not exists("/proc/%d" % tid)]:
+                        del processes[thread_id]
+                        del start_times[thread_id]
+                    process_limit = max(PROCESS_LIMIT, 2 * len(processes))
+                try:
+                    thread_group = thread_group_id(notification.pid)
+                    parent = parent_process_id(thread_group) if not is_known(thread_group) else None
+                except (IOError, OSError):
+                    # The thread has been killed in the meantime
+                    thread_group = notification.pid
+                    parent = None
+                if thread_group not in processes:
+                    if is_known(parent):
+                        # Forks are not reported here either, so a new process inherits the file descriptors
+                        # (including fake ones) its parent has when it is first seen, rather than when it was
+                        # created. The difference only matters if the parent has changed them in between.
+                        add_thread(thread_group, processes[parent].fork(Tracee(notification.pid)))
+                    else:
+                        add_thread(thread_group, Process(Tracee(notification.pid)))
+                if notification.pid != thread_group:
+                    add_thread(notification.pid, processes[thread_group])
+            process = processes[notification.pid]
+            process.set_thread(Tracee(notification.pid))
+            arguments = SyscallArguments(process, syscall, list(notification.data.args))
+
+            if syscall in syscall_filters:
+                if verbose:
+                    EVENTS.verbose(notification.pid, format_syscall(syscall, arguments), True)
+                try:
+                    if STATS.enabled:
+                        decision = STATS.call_filter(syscall, syscall_filters[syscall], process, arguments)
+                    else:
+                        decision = syscall_filters[syscall](process, arguments)
+                except BadAddress:
+                    # Failed like the kernel would (see get_operations)
+                    decision = None, -EFAULT
+                if not isinstance(decision, tuple):
+                    # The response is sent once the decision is available
+                    pending_decisions[notification.id] = (notification.pid, process, syscall, arguments, decision,
+                                                          response)
+                    continue
+            else:
+                decision = None, None
+
+            respond(notification.pid, process, syscall, arguments, decision, response)
+        else:
+            libc.ioctl(listener, c_ulong(SECCOMP_IOCTL_NOTIF_SEND), byref(response))
+
+    return operations
@@ -0,0 +1,214 @@
+# maybe - see what a program does before deciding whether you really want it to happen
+#
+# Copyright (c) 2016-2017 Philipp Emanuel Weidmann <pew@worldwidemann.com>
+#
+# Nemo vir est qui mundum non reddat meliorem.
+#
+# Released under the terms of the GNU General Public License, version 3
+# (https://gnu.org/licenses/gpl.html)
+
+
+import pickle
+from os import SEEK_END
+from os.path import dirname, basename
+from tempfile import TemporaryFile
+from pwd import getpwuid
+from grp import getgrgid
+
+from six import string_types
+
+from . import T
+
+try:
+    from sys import intern
+except ImportError:
+    # Python 2 can only intern byte strings
+    def intern(string):
+        return string
+
+
+# Number of operations kept in memory by default
+DEFAULT_SPILL_THRESHOLD = 100000
+
+
+# Operation prevented by a filter, which is only turned into text (by format_operation)
+# when it is reported. "kind" is one of the keys of COLORS, "path" is the path of the file
+# the operation is performed on, and the remaining fields are only set for some kinds.
+# "content" is the contents of a symbolic link, or, in overlay mode, the file in the overlay
+# holding the contents of a file that has been written to.
+class Operation(object):
+    __slots__ = ("kind", "path", "target", "byte_count", "mode", "owner", "group", "content")
+
+    def __init__(self, kind, path, target=None, byte_count=None, mode=None, owner=None, group=None,
+                 content=None):
+        self.kind = kind
+        # Operations on the same file share the path string
+        self.path = intern(path)
+        self.target = None if target is None else intern(target)
+        self.byte_count = byte_count
+        self.mode = mode
+        self.owner = owner
+        self.group = group
+        self.content = content
+
+    def _values(self):
+        return tuple(getattr(self, field) for field in self.__slots__)
+
+    def __eq__(self, other):
+        return isinstance(other, Operation) and self._values() == other._values()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return "Operation(%s)" % ", ".join("%s=%r" % item for item in self.as_dict().items())
+
+    # Returns the fields that are set
+    def as_dict(self):
+        return dict((field, getattr(self, field)) for field in self.__slots__ if getattr(self, field) is not None)
+
+
+# Colors of the labels of the operation kinds
+COLORS = {
+    "create_file": "cyan",
+    "create_directory": "cyan",
+    "create_named_pipe": "cyan",
+    "create_socket": "cyan",
+    "create_character_special_file": "cyan",
+    "create_block_special_file": "cyan",
+    "create_symbolic_link": "cyan",
+    "create_hard_link": "cyan",
+    "truncate_file": "red",
+    "write": "red",
+    "delete": "red",
+    "move": "green",
+    "change_permissions": "yellow",
+    "change_owner": "yellow",
+}
+
+
+def format_permissions(permissions):
+    result = ""
+    for i in range(2, -1, -1):
+        result += "r" if permissions & (4 * 8**i) else "-"
+        result += "w" if permissions & (2 * 8**i) else "-"
+        result += "x" if permissions & (1 * 8**i) else "-"
+    return result
+
+
+def format_operation(operation):
+    if isinstance(operation, string_types):
+        # Returned by a plugin filter
+        return operation
+
+    kind = operation.kind
+    label = kind.replace("_", " ")
+    path = T.underline(operation.path)
+
+    if kind == "create_file":
+        details = []
+        if operation.byte_count:
+            details.append(T.bold("%d bytes" % operation.byte_count))
+        if operation.mode is not None:
+            details.append("permissions %s" % T.bold(format_permissions(operation.mode)))
+        return "%s %s%s" % (T.cyan(label), path, (" with " + " and ".join(details)) if details else "")
+    elif kind == "write":
+        return "%s %s to %s" % (T.red(label), T.bold("%d bytes" % operation.byte_count), path)
+    elif kind == "move":
+        if dirname(operation.path) == dirname(operation.target):
+            return "%s %s to %s" % (T.green("rename"), path, T.underline(basename(operation.target)))
+        return "%s %s to %s" % (T.green(label), path, T.underline(operation.target))
+    elif kind in ("create_symbolic_link", "create_hard_link"):
+        return "%s from %s to %s" % (T.cyan(label), path, T.underline(operation.target))
+    elif kind == "change_permissions":
+        return "%s of %s to %s" % (T.yellow(label), path, T.bold(format_permissions(operation.mode)))
+    elif kind == "change_owner":
+        if operation.owner == -1:
+            label = "change group"
+            owner = getgrgid(operation.group)[0]
+        elif operation.group == -1:
+            owner = getpwuid(operation.owner)[0]
+        else:
+            owner = getpwuid(operation.owner)[0] + ":" + getgrgid(operation.group)[0]
+        return "%s of %s to %s" % (T.yellow(label), path, T.bold(owner))
+    else:
+        return "%s %s" % (getattr(T, COLORS[kind])(label), path)
+
+
+# Collects the operations prevented by filters, combining operations where possible:
+# Consecutive writes to a file are merged into one, writes to and permission changes
+# of a file that has just been created are folded into its creation, and operations
+# identical to the last one on the same file are only listed once. Only the last
+# operation on each file is remembered for this purpose.
+# Once more than spill_threshold operations have been collected, they are written to
+# a temporary file (and no longer combined with subsequent operations), so the memory
+# used by the log is bounded no matter how many operations a command performs.
+class OperationLog(object):
+    def __init__(self, spill_threshold=DEFAULT_SPILL_THRESHOLD):
+        self._spill_threshold = spill_threshold
+        self._operations = []
+        # Maps paths to the last operations on them
+        self._last_operations = {}
+        self._spill_file = None
+        self._spilled_count = 0
+
+    def __len__(self):
+        return self._spilled_count + len(self._operations)
+
+    # Yields all operations, reading spilled ones back from the temporary file
+    def __iter__(self):
+        if self._spill_file is not None:
+            self._spill_file.seek(0)
+            while True:
+                try:
+                    operations = pickle.load(self._spill_file)
+                except EOFError:
+                    break
+                for operation in operations:
+                    yield operation
+            self._spill_file.seek(0, SEEK_END)
+        for operation in self._operations:
+            yield operation
+
+    def append(self, operation):
+        if isinstance(operation, string_types):
+            # Operations described by strings can only be compared as a whole
+            if not self._operations or self._operations[-1] != operation:
+                self._add(operation)
+            return
+
+        last_operation = self._last_operations.get(operation.path)
+
+        if last_operation is None:
+            pass
+        elif operation.kind == "write" and last_operation.kind in ("write", "create_file"):
+            # The log owns its operations, so they can be updated in place
+            last_operation.byte_count = (last_operation.byte_count or 0) + operation.byte_count
+            return
+        elif operation.kind == "change_permissions" and last_operation.kind == "create_file":
+            last_operation.mode = operation.mode
+            return
+        elif operation == last_operation:
+            return
+
+        self._add(operation)
+        self._last_operations[operation.path] = operation
+
+    def _add(self, operation):
+        if len(self._operations) >= self._spill_threshold:
+            self._spill()
+        self._operations.append(operation)
+
+    def _spill(self):
+        if self._spill_file is None:
+            self._spill_file = TemporaryFile(prefix="maybe-")
+        # Operations are written in batches, each of which is read back at once
+        pickle.dump(self._operations, self._spill_file, pickle.HIGHEST_PROTOCOL)
+        self._spilled_count += len(self._operations)
+        self._operations = []
+        self._last_operations.clear()
+
+    def close(self):
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
@@ -0,0 +1,118 @@
+# maybe - see what a program does before deciding whether you really want it to happen
+#
+# Copyright (c) 2016-2017 Philipp Emanuel Weidmann <pew@worldwidemann.com>
+#
+# Nemo vir est qui mundum non reddat meliorem.
+#
+# Released under the terms of the GNU General Public License, version 3
+# (https://gnu.org/licenses/gpl.html)
+
+
+from os import mkdir, mkfifo, mknod, rename, rmdir, unlink, chmod, chown, symlink, link
+from os.path import join, exists, isfile, isdir, islink
+from shutil import copy, copyfile, rmtree
+from stat import S_IFSOCK
+from tempfile import mkdtemp
+
+from six import string_types
+
+
+# Operations that can be performed by Overlay.apply
+APPLICABLE_KINDS = set(["create_file", "truncate_file", "write", "create_directory", "create_named_pipe",
+                        "create_socket", "create_symbolic_link", "create_hard_link", "delete", "move",
+                        "change_permissions", "change_owner"])
+
+
+# Scratch directory holding the contents of the files the command has created or written to.
+# In overlay mode, filters let the command open these files in place of the real ones,
+# so the operations they have prevented can later be applied without rerunning the command.
+class Overlay(object):
+    def __init__(self):
+        self.directory = None
+        # Maps paths to the files in the scratch directory holding their contents
+        self._files = {}
+
+    @property
+    def active(self):
+        return self.directory is not None
+
+    def activate(self):
+        self.directory = mkdtemp(prefix="maybe-overlay-")
+
+    def remove(self):
+        if self.directory is not None:
+            rmtree(self.directory, True)
+            self.directory = None
+            self._files.clear()
+
+    # Returns the file holding the contents of path, if any
+    def file(self, path):
+        return self._files.get(path)
+
+    # Returns the file to be opened in place of path when it is opened for writing,
+    # copying the contents of path to it first unless they are about to be discarded anyway
+    def open_for_writing(self, path, truncate=False):
+        if path not in self._files:
+            scratch_path = join(self.directory, str(len(self._files)))
+            if not truncate and isfile(path):
+                copyfile(path, scratch_path)
+            self._files[path] = scratch_path
+        return self._files[path]
+
+    def move(self, path_old, path_new):
+        if path_old in self._files:
+            self._files[path_new] = self._files.pop(path_old)
+        else:
+            # Contents of path_old (if any) are no longer those of path_new
+            self._files.pop(path_new, None)
+
+    def delete(self, path):
+        self._files.pop(path, None)
+
+    def can_apply(self, operations):
+        for operation in operations:
+            if isinstance(operation, string_types) or operation.kind not in APPLICABLE_KINDS:
+                return False
+            if operation.kind in ("truncate_file", "write", "create_symbolic_link") and operation.content is None:
+                return False
+        return True
+
+    # Performs the operations on the real file system, in the order in which they were prevented
+    def apply(self, operations):
+        for operation in operations:
+            kind, path = operation.kind, operation.path
+            if kind == "create_file":
+                if operation.content is not None:
+                    # Also copies the permissions the file has been created with
+                    copy(operation.content, path)
+                else:
+                    open(path, "a").close()
+                if operation.mode is not None:
+                    chmod(path, operation.mode)
+            elif kind in ("truncate_file", "write"):
+                copyfile(operation.content, path)
+            elif kind == "create_directory":
+                mkdir(path)
+            elif kind == "create_named_pipe":
+                mkfifo(path)
+            elif kind == "create_socket":
+                mknod(path, S_IFSOCK | 0o666)
+            elif kind == "create_symbolic_link":
+                symlink(operation.content, path)
+            elif kind == "create_hard_link":
+                link(operation.target, path)
+            elif kind == "delete":
+                if isdir(path) and not islink(path):
+                    rmdir(path)
+                # Files that don't exist are "deleted" as well
+                elif islink(path) or exists(path):
+                    unlink(path)
+            elif kind == "move":
+                rename(path, operation.target)
+            elif kind == "change_permissions":
+                chmod(path, operation.mode)
+            elif kind == "change_owner":
+                chown(path, operation.owner, operation.group)
+
+
+OVERLAY = Overlay()
@@ -0,0 +1,79 @@
+# maybe - see what a program does before deciding whether you really want it to happen
+#
+# Copyright (c) 2016-2017 Philipp Emanuel Weidmann <pew@worldwidemann.com>
+#
+# Nemo vir est qui mundum non reddat meliorem.
+#
+# Released under the terms of the GNU General Public License, version 3
+# (https://gnu.org/licenses/gpl.html)
+
+
+import sys
+import marshal
+from os import environ, stat, makedirs, rename, getpid
+from os.path import join, abspath, expanduser, splitext, basename, isdir
+from types import ModuleType
+from struct import Struct
+from hashlib import sha1
+
+from six import PY2
+
+
+# Compiled plugins are cached here, like Python caches compiled modules in __pycache__
+# (which plugins might not be able to write to)
+PLUGIN_CACHE_DIRECTORY = join(environ.get("XDG_CACHE_HOME") or expanduser("~/.cache"), "maybe", "plugins")
+
+# Modification time and size of the plugin the cached code has been compiled from
+CACHE_HEADER = Struct("=dQ")
+
+
+def cache_path(plugin_path):
+    # marshal's format depends on the version of Python
+    key = "%s\0%s" % (abspath(plugin_path), sys.version)
+    key = key.encode("utf-8") if PY2 else key.encode(sys.getfilesystemencoding(), "surrogateescape")
+    return join(PLUGIN_CACHE_DIRECTORY, sha1(key).hexdigest())
+
+
+# Returns the code object for the plugin, which is only compiled if it has changed since it has been cached
+def compile_plugin(plugin_path):
+    status = stat(plugin_path)
+    header = CACHE_HEADER.pack(status.st_mtime, status.st_size)
+    path = cache_path(plugin_path)
+    try:
+        with open(path, "rb") as cache_file:
+            if cache_file.read(CACHE_HEADER.size) == header:
+                return marshal.loads(cache_file.read())
+    except (IOError, OSError, ValueError, EOFError, TypeError):
+        pass
+
+    with open(plugin_path, "rb") as plugin_file:
+        code = compile(plugin_file.read(), plugin_path, "exec", dont_inherit=True)
+
+    try:
+        if not isdir(PLUGIN_CACHE_DIRECTORY):
+            makedirs(PLUGIN_CACHE_DIRECTORY)
+        # Other instances of maybe must never read an incomplete file
+        temporary_path = "%s.%d" % (path, getpid())
+        with open(temporary_path, "wb") as cache_file:
+            cache_file.write(header)
+            cache_file.write(marshal.dumps(code))
+        rename(temporary_path, path)
+    except (IOError, OSError):
+        # Plugins still work without a cache
+        pass
+    return code
+
+
+# Executes the plugin as a module named after the file, like imp.load_source did
+def load_plugin(plugin_path):
+    module_name = splitext(basename(plugin_path))[0]
+    code = compile_plugin(plugin_path)
+    module = ModuleType(str(module_name))
+    module.__file__ = plugin_path
+    sys.modules[module_name] = module
+    try:
+        exec(code, module.__dict__)
+    except BaseException:
+        del sys.modules[module_name]
+        raise
+    return module
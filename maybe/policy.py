@@ -0,0 +1,107 @@
+# maybe - see what a program does before deciding whether you really want it to happen
+#
+# Copyright (c) 2016-2017 Philipp Emanuel Weidmann <pew@worldwidemann.com>
+#
+# Nemo vir est qui mundum non reddat meliorem.
+#
+# Released under the terms of the GNU General Public License, version 3
+# (https://gnu.org/licenses/gpl.html)
+
+
+import re
+import shlex
+from os import getcwd
+from os.path import join, normpath
+
+from .shadow import FILESYSTEM
+
+
+# Translates a glob into a regular expression matching the same paths:
+# "**" matches any string, "*" any string not containing "/", "?" any character but "/",
+# and "[...]" (or "[!...]") any character (not) in the brackets
+def translate_glob(glob):
+    result = ""
+    i = 0
+    while i < len(glob):
+        if glob.startswith("**", i):
+            result += ".*"
+            i += 2
+        elif glob[i] == "*":
+            result += "[^/]*"
+            i += 1
+        elif glob[i] == "?":
+            result += "[^/]"
+            i += 1
+        elif glob[i] == "[" and "]" in glob[i + 2:]:
+            end = glob.index("]", i + 2)
+            characters = glob[i + 1:end]
+            if characters.startswith("!"):
+                characters = "^" + characters[1:]
+            result += "[%s]" % characters.replace("\\", "\\\\")
+            i = end + 1
+        else:
+            result += re.escape(glob[i])
+            i += 1
+    return result
+
+
+# Rules from a policy file, which let the command perform operations on some paths
+# even though the filters for these operations are enabled. Each line of the file
+# consists of "allow" or "deny", the operation (filter scope) the rule applies to
+# (or "*" for all operations), and one or more globs (relative ones are relative
+# to the current directory). Empty lines and lines starting with "#" are ignored.
+# The first rule matching a path decides, and operations on paths matching no rule
+# are prevented. The rules for each operation are compiled into a single regular
+# expression, whose named groups tell which kind of rule has matched.
+class Policy(object):
+    def __init__(self):
+        # Maps filter scopes to the expressions for their rules
+        self._expressions = {}
+
+    def clear(self):
+        self._expressions = {}
+
+    # Replaces the rules with those in the file, raising ValueError if it is malformed
+    def load(self, policy_path, filter_scopes):
+        rules = []
+        with open(policy_path) as policy_file:
+            for line_number, line in enumerate(policy_file, 1):
+                words = shlex.split(line, True)
+                if not words:
+                    continue
+                if len(words) < 3 or words[0] not in ("allow", "deny"):
+                    raise ValueError("line %d: expected 'allow' or 'deny', an operation, and paths" % line_number)
+                if words[1] != "*" and words[1] not in filter_scopes:
+                    raise ValueError("line %d: unknown operation %s" % (line_number, words[1]))
+                for glob in words[2:]:
+                    rules.append((words[0], words[1], normpath(join(getcwd(), glob))))
+
+        expressions = {}
+        for filter_scope in filter_scopes:
+            patterns = ["(?P<%s%d>%s)" % (action, i, translate_glob(glob))
+                        for i, (action, scope, glob) in enumerate(rules) if scope in ("*", filter_scope)]
+            if patterns:
+                expressions[filter_scope] = re.compile("(?:%s)\\Z" % "|".join(patterns), re.DOTALL)
+        self._expressions = expressions
+
+    def allows(self, filter_scope, path):
+        expression = self._expressions.get(filter_scope)
+        if expression is None:
+            return False
+        match = expression.match(path)
+        # Alternatives are tried from left to right, so the group that has matched is the first rule that matches
+        return match is not None and match.lastgroup.startswith("allow")
+
+
+POLICY = Policy()
+
+
+# Returns whether the policy lets the command perform the operation on all of the paths,
+# which the shadow file system then no longer knows better about than the real one
+def permits(filter_scope, *paths):
+    for path in paths:
+        if not POLICY.allows(filter_scope, path):
+            return False
+    for path in paths:
+        FILESYSTEM.forget(path)
+    return True
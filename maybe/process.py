@@ -8,43 +8,431 @@
 # (https://gnu.org/licenses/gpl.html)
 
 
-from os import readlink
-from os.path import normpath, join
+import sys
+from os import readlink, O_DIRECTORY, O_WRONLY, O_RDWR
+from os.path import normpath, join, isabs, realpath
+from fcntl import F_DUPFD, F_SETFD, FD_CLOEXEC
+from heapq import heappush, heappop
+from collections import namedtuple
+from mmap import PAGESIZE
+from errno import ENOSYS
+from ctypes import (CDLL, Structure, c_void_p, c_size_t, c_ulong, c_int, byref, addressof, create_string_buffer,
+                    get_errno)
 
+from six import PY2
+from ptrace.cpu_info import CPU_POWERPC
 from ptrace.syscall.posix_arg import AT_FDCWD
 
+from .arguments import ARGUMENT_REGISTERS, BadAddress
+from .overlay import OVERLAY
+from .shadow import FILESYSTEM, MISSING
+from .stats import STATS
 
+
+libc = CDLL(None, use_errno=True)
+
+
+class iovec(Structure):
+    _fields_ = [("iov_base", c_void_p), ("iov_len", c_size_t)]
+
+
+# Not available in Python 2
+O_CLOEXEC = 0o2000000
+F_DUPFD_CLOEXEC = 1030
+# See linux/close_range.h
+CLOSE_RANGE_CLOEXEC = 1 << 2
+
+# Area below the stack pointer that functions may use without moving the stack pointer
+STACK_RED_ZONE = 288 if CPU_POWERPC else 128
+# Longest path (in bytes, including the terminating NUL) that replace_path_argument writes below the red zone.
+# Threads (or e.g. goroutines) can have small stacks, and the paths replaced are those of files
+# in the overlay's scratch directory, which are much shorter.
+STACK_PATH_LIMIT = 256
+
+# Entry in a DescriptorTable. "tracked" is set for file descriptors registered by filters,
+# which refer to files that the process believes it has opened for writing.
+Descriptor = namedtuple("Descriptor", ["path", "tracked", "close_on_exec"])
+
+
+# Mirrors the file descriptors of a process, as far as they are of interest to maybe.
+# File descriptors returned by filters in place of real ones ("fake" file descriptors)
+# are allocated like the kernel does, i.e. the lowest free number is used first.
+class DescriptorTable(object):
+    # Start with a large number to avoid collisions with other FDs
+    FIRST_FAKE_DESCRIPTOR = 1000000
+
+    def __init__(self):
+        # Number of processes sharing this table
+        self.references = 1
+        self._descriptors = {}
+        self._next_fake_descriptor = self.FIRST_FAKE_DESCRIPTOR
+        # Heap of fake file descriptors that have been closed
+        self._free_fake_descriptors = []
+
+    def __len__(self):
+        return len(self._descriptors)
+
+    def __contains__(self, file_descriptor):
+        return file_descriptor in self._descriptors
+
+    def get(self, file_descriptor):
+        return self._descriptors.get(file_descriptor)
+
+    def copy(self):
+        table = DescriptorTable()
+        table._descriptors = dict(self._descriptors)
+        table._next_fake_descriptor = self._next_fake_descriptor
+        table._free_fake_descriptors = list(self._free_fake_descriptors)
+        return table
+
+    def is_fake(self, file_descriptor):
+        return file_descriptor >= self.FIRST_FAKE_DESCRIPTOR
+
+    def allocate(self):
+        if self._free_fake_descriptors:
+            return heappop(self._free_fake_descriptors)
+        self._next_fake_descriptor += 1
+        return self._next_fake_descriptor - 1
+
+    def set(self, file_descriptor, descriptor):
+        self._descriptors[file_descriptor] = descriptor
+
+    def close(self, file_descriptor):
+        if self._descriptors.pop(file_descriptor, None) is not None and self.is_fake(file_descriptor):
+            heappush(self._free_fake_descriptors, file_descriptor)
+
+    def close_range(self, first, last, close_on_exec=False):
+        for file_descriptor in [fd for fd in self._descriptors if first <= fd <= last]:
+            if close_on_exec:
+                self._descriptors[file_descriptor] = self._descriptors[file_descriptor]._replace(close_on_exec=True)
+            else:
+                self.close(file_descriptor)
+
+    def close_on_exec_descriptors(self):
+        return [fd for fd, descriptor in self._descriptors.items() if descriptor.close_on_exec]
+
+
+# State shared by all threads of a thread group, like the kernel does
+# (at least for threads created with the usual clone flags)
 class Process(object):
     def __init__(self, ptrace_process):
         self._process = ptrace_process
-        # Start with a large number to avoid collisions with other FDs
-        self._next_file_descriptor = 1000000
-        self._file_descriptors = {}
+        # Registers of the thread, through which changes to them are written at once
+        # (if None, they are changed through the thread itself)
+        self._registers = None
+        self.threads = 1
+        self._descriptors = DescriptorTable()
+        # The working directory, as far as it is known
+        # (otherwise, it is looked up in /proc when needed)
+        self._working_directory = None
+
+    # Returns a Process for a child of this process, which inherits its state
+    def fork(self, ptrace_process):
+        process = Process(ptrace_process)
+        # The table is only copied once either process modifies it
+        process._descriptors = self._descriptors
+        self._descriptors.references += 1
+        process._working_directory = self._working_directory
+        return process
+
+    # Makes the process be inspected through the given thread,
+    # since the thread it has been inspected through might have exited
+    def set_thread(self, ptrace_process, registers=None):
+        self._process = ptrace_process
+        self._registers = registers
+
+    def add_thread(self):
+        self.threads += 1
+
+    # Returns whether the last thread of the process has exited
+    def remove_thread(self):
+        self.threads -= 1
+        if self.threads == 0:
+            # Let processes still sharing the descriptor table use it without copying
+            self._descriptors.references -= 1
+            return True
+        return False
+
+    # Returns the process's own descriptor table, copying it first if it is shared
+    def _descriptor_table(self):
+        if self._descriptors.references > 1:
+            self._descriptors.references -= 1
+            self._descriptors = self._descriptors.copy()
+        return self._descriptors
+
+    def execute(self):
+        for file_descriptor in self._descriptors.close_on_exec_descriptors():
+            self._descriptor_table().close(file_descriptor)
+
+    # Called before the process changes its working directory to path (None if it isn't known,
+    # in which case it is looked up again once it is needed). Until the result of the syscall
+    # is known, the working directory has to be looked up again.
+    def change_directory(self, path):
+        working_directory = self._working_directory
+        self._working_directory = None
+        if path is None:
+            return None
+
+        def directory_changed(result):
+            # Like the kernel, store the working directory with all symbolic links resolved
+            self._working_directory = realpath(path) if result == 0 else working_directory
+        return directory_changed
+
+    # Called before the process opens the directory at path
+    def open_directory(self, path, close_on_exec=False):
+        def directory_opened(result):
+            if result >= 0:
+                self._descriptor_table().set(result, Descriptor(realpath(path), False, close_on_exec))
+        return directory_opened
+
+    # Called before the process opens the file at path
+    def open_file(self, path, tracked=False, close_on_exec=False):
+        def file_opened(result):
+            if result >= 0:
+                self._descriptor_table().set(result, Descriptor(path, tracked, close_on_exec))
+        return file_opened
+
+    # Called before the process duplicates file_descriptor
+    def duplicate_descriptor(self, file_descriptor, close_on_exec=False):
+        def descriptor_duplicated(result):
+            if result >= 0:
+                descriptor = self._descriptors.get(file_descriptor)
+                if descriptor is not None:
+                    self._descriptor_table().set(result, descriptor._replace(close_on_exec=close_on_exec))
+        return descriptor_duplicated
+
+    # Called before the process closes file_descriptor (or otherwise reuses its number)
+    def close_descriptor(self, file_descriptor):
+        if file_descriptor in self._descriptors:
+            self._descriptor_table().close(file_descriptor)
 
-    def register_path(self, path, file_descriptor=None):
+    def close_descriptors(self, first, last, close_on_exec=False):
+        self._descriptor_table().close_range(first, last, close_on_exec)
+
+    def set_close_on_exec(self, file_descriptor, close_on_exec):
+        descriptor = self._descriptors.get(file_descriptor)
+        if descriptor is not None:
+            self._descriptor_table().set(file_descriptor, descriptor._replace(close_on_exec=close_on_exec))
+
+    def is_fake_descriptor(self, file_descriptor):
+        return self._descriptors.is_fake(file_descriptor) and file_descriptor in self._descriptors
+
+    # Returns fewer bytes than requested if the range extends into unmapped memory
+    def read_memory(self, address, size):
+        buffer = create_string_buffer(size)
+        local_iovec = iovec(addressof(buffer), size)
+        remote_iovec = iovec(address, size)
+        # Reads the whole range with a single syscall, rather than word by word like PTRACE_PEEKDATA
+        count = libc.process_vm_readv(c_int(self._process.pid), byref(local_iovec), c_ulong(1),
+                                      byref(remote_iovec), c_ulong(1), c_ulong(0))
+        if count >= 0:
+            return buffer.raw[:count]
+        if get_errno() != ENOSYS:
+            # Memory is not mapped or not readable
+            return b""
+        # process_vm_readv is not available everywhere (e.g. on kernels older than 3.2)
+        if STATS.enabled:
+            STATS.procfs_lookups["mem"] += 1
+        with open("/proc/%d/mem" % self._process.pid, "rb", 0) as memory:
+            memory.seek(address)
+            try:
+                return memory.read(size)
+            except (IOError, OSError):
+                return b""
+
+    def write_memory(self, address, data):
+        buffer = create_string_buffer(data, len(data))
+        local_iovec = iovec(addressof(buffer), len(data))
+        remote_iovec = iovec(address, len(data))
+        count = libc.process_vm_writev(c_int(self._process.pid), byref(local_iovec), c_ulong(1),
+                                       byref(remote_iovec), c_ulong(1), c_ulong(0))
+        if count != len(data):
+            self._process.writeBytes(address, data)
+
+    # Makes the syscall the process is about to execute use path as its argument at index.
+    # The argument register is restored once the syscall has been executed (see Registers.set_argument).
+    def replace_path_argument(self, index, path):
+        if PY2:
+            data = path.encode(sys.getfilesystemencoding()) + b"\0"
+        else:
+            data = path.encode(sys.getfilesystemencoding(), "surrogateescape") + b"\0"
+        if len(data) > STACK_PATH_LIMIT:
+            raise ValueError("path too long to be passed on the stack: %s" % path)
+        # The stack below the red zone is not in use while the process is executing a syscall
+        if self._registers is not None:
+            address = (self._registers.stack_pointer() - STACK_RED_ZONE - len(data)) & ~15
+            self.write_memory(address, data)
+            self._registers.set_argument(ARGUMENT_REGISTERS[index], address)
+        else:
+            address = (self._process.getStackPointer() - STACK_RED_ZONE - len(data)) & ~15
+            self.write_memory(address, data)
+            self._process.setreg(ARGUMENT_REGISTERS[index], address)
+
+    # Raises BadAddress if the string extends into memory that cannot be read
+    def read_string(self, address):
+        if not address:
+            raise BadAddress(address)
+        start = address
+        chunks = []
+        while True:
+            # Reads never cross a page boundary, so they can't fail
+            # just because the string is located right before unmapped memory
+            size = PAGESIZE - (address % PAGESIZE)
+            chunk = self.read_memory(address, size)
+            end = chunk.find(b"\0")
+            if end != -1:
+                chunks.append(chunk[:end])
+                break
+            if len(chunk) < size:
+                raise BadAddress(start)
+            chunks.append(chunk)
+            address += size
+        data = b"".join(chunks)
+        if PY2:
+            return unicode(data, sys.getfilesystemencoding())  # noqa
+        else:
+            return data.decode(sys.getfilesystemencoding(), "surrogateescape")
+
+    def register_path(self, path, file_descriptor=None, close_on_exec=False):
+        table = self._descriptor_table()
         if file_descriptor is None:
-            file_descriptor = self._next_file_descriptor
-            self._next_file_descriptor += 1
-        self._file_descriptors[file_descriptor] = path
+            file_descriptor = table.allocate()
+        table.set(file_descriptor, Descriptor(path, True, close_on_exec))
         return file_descriptor
 
     def is_tracked_descriptor(self, file_descriptor):
-        return file_descriptor in self._file_descriptors
+        descriptor = self._descriptors.get(file_descriptor)
+        return descriptor is not None and descriptor.tracked
 
     def descriptor_path(self, file_descriptor):
-        if file_descriptor in self._file_descriptors:
-            path = self._file_descriptors[file_descriptor]
+        descriptor = self._descriptors.get(file_descriptor)
+        if descriptor is not None:
+            path = descriptor.path
         else:
             path = readlink("/proc/%d/fd/%d" % (self._process.pid, file_descriptor))
+            if STATS.enabled:
+                STATS.procfs_lookups["fd"] += 1
         return normpath(path)
 
+    # Returns the mode (as in st_mode) of the file at path as the process sees it,
+    # i.e. including the effects of prevented operations, or None if it doesn't exist
+    def file_mode(self, path):
+        mode = FILESYSTEM.mode(path)
+        return None if mode == MISSING else mode
+
+    def file_exists(self, path):
+        return FILESYSTEM.exists(path)
+
+    def working_directory(self):
+        if self._working_directory is None:
+            self._working_directory = readlink("/proc/%d/cwd" % self._process.pid)
+            if STATS.enabled:
+                STATS.procfs_lookups["cwd"] += 1
+        return self._working_directory
+
     # Implements the path resolution logic of the "*at" syscalls
     def full_path(self, path, directory_descriptor=AT_FDCWD):
-        if directory_descriptor == AT_FDCWD:
+        if isabs(path):
+            return normpath(path)
+        elif directory_descriptor == AT_FDCWD:
             # Current working directory
-            directory = readlink("/proc/%d/cwd" % self._process.pid)
+            directory = self.working_directory()
         else:
             # Directory referred to by directory_descriptor
             directory = self.descriptor_path(directory_descriptor)
-        # Note that join will discard directory if path is absolute, as desired
         return normpath(join(directory, path))
+
+
+def _status_field(thread_id, field):
+    if STATS.enabled:
+        STATS.procfs_lookups["status"] += 1
+    with open("/proc/%d/status" % thread_id) as status:
+        for line in status:
+            if line.startswith(field):
+                return int(line.split()[1])
+
+
+def thread_group_id(thread_id):
+    return _status_field(thread_id, "Tgid:")
+
+
+def parent_process_id(thread_id):
+    return _status_field(thread_id, "PPid:")
+
+
+# Returns the time the thread has been started at (in clock ticks since boot),
+# which tells apart threads that have had the same ID
+def start_time(thread_id):
+    if STATS.enabled:
+        STATS.procfs_lookups["stat"] += 1
+    with open("/proc/%d/stat" % thread_id) as stat:
+        # The name of the command (in parentheses) can contain spaces
+        return int(stat.read().rsplit(")", 1)[1].split()[19])
+
+
+def _track_open(process, path, flags, directory_descriptor=AT_FDCWD):
+    if flags & O_DIRECTORY:
+        return process.open_directory(process.full_path(path, directory_descriptor), bool(flags & O_CLOEXEC))
+    elif OVERLAY.active:
+        path = process.full_path(path, directory_descriptor)
+        if OVERLAY.file(path) is not None:
+            # The process has been made to open the file in the overlay instead,
+            # which has to be known by the file's real path
+            return process.open_file(path, bool(flags & (O_WRONLY | O_RDWR)), bool(flags & O_CLOEXEC))
+
+
+def _track_fchdir(process, file_descriptor):
+    try:
+        path = process.descriptor_path(file_descriptor)
+    except (IOError, OSError):
+        # Not an open file descriptor (the syscall is going to fail with EBADF),
+        # or one that another thread has closed in the meantime
+        path = None
+    return process.change_directory(path)
+
+
+def _track_dup(process, file_descriptor_old, file_descriptor_new, flags):
+    process.close_descriptor(file_descriptor_new)
+    return process.duplicate_descriptor(file_descriptor_old, bool(flags & O_CLOEXEC))
+
+
+def _track_fcntl(process, file_descriptor, command, argument):
+    if command in (F_DUPFD, F_DUPFD_CLOEXEC):
+        return process.duplicate_descriptor(file_descriptor, command == F_DUPFD_CLOEXEC)
+    elif command == F_SETFD:
+        process.set_close_on_exec(file_descriptor, bool(argument & FD_CLOEXEC))
+
+
+# Syscalls that change the state Process keeps track of, mapped to functions that are called
+# before the syscall is executed, unless a filter has prevented its execution. If such a function
+# returns another function, that function is called with the result of the syscall once it is known.
+SYSCALL_TRACKERS = {
+    "chdir": lambda process, args: process.change_directory(process.full_path(args[0])),
+    "fchdir": lambda process, args: _track_fchdir(process, args[0]),
+    "open": lambda process, args: _track_open(process, args[0], args[1]),
+    "openat": lambda process, args: _track_open(process, args[1], args[2], args[0]),
+    "creat": lambda process, args: _track_open(process, args[0], O_WRONLY),
+    "close": lambda process, args: process.close_descriptor(args[0]),
+    "close_range": lambda process, args:
+        process.close_descriptors(args[0], args[1], bool(args[2] & CLOSE_RANGE_CLOEXEC)),
+    "dup": lambda process, args: process.duplicate_descriptor(args[0]),
+    "dup2": lambda process, args: _track_dup(process, args[0], args[1], 0),
+    "dup3": lambda process, args: _track_dup(process, args[0], args[1], args[2]),
+    "fcntl": lambda process, args: _track_fcntl(process, args[0], args[1], args[2]),
+}
+
+# Trackers that keep the working directory up to date, which filters resolving relative paths depend on
+DIRECTORY_TRACKERS = ["chdir", "fchdir"]
+# Syscalls whose filters can return fake file descriptors, which the file descriptor tables
+# (and with them, every syscall changing them) only have to be mirrored for
+DESCRIPTOR_SYSCALLS = ["open", "openat", "creat"]
+
+
+# Returns the trackers needed by syscall_filters, so the command isn't stopped
+# at syscalls that only change state no filter ever looks at
+def select_trackers(syscall_filters):
+    if not syscall_filters:
+        return {}
+    if OVERLAY.active or any(syscall in syscall_filters for syscall in DESCRIPTOR_SYSCALLS):
+        return SYSCALL_TRACKERS
+    return dict((syscall, SYSCALL_TRACKERS[syscall]) for syscall in DIRECTORY_TRACKERS)
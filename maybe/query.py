@@ -0,0 +1,106 @@
+# maybe - see what a program does before deciding whether you really want it to happen
+#
+# Copyright (c) 2016-2017 Philipp Emanuel Weidmann <pew@worldwidemann.com>
+#
+# Nemo vir est qui mundum non reddat meliorem.
+#
+# Released under the terms of the GNU General Public License, version 3
+# (https://gnu.org/licenses/gpl.html)
+
+
+# "maybe report": Queries recordings made with --record
+
+from __future__ import unicode_literals, print_function
+
+from os.path import abspath
+from argparse import ArgumentParser
+from collections import Counter
+
+from ptrace.syscall import SYSCALL_NAMES
+
+from . import T, initialize_terminal
+from .operations import COLORS
+from .record import Recording
+
+
+def syscall_name(number):
+    # Recordings are assumed to have been made on the same architecture
+    return SYSCALL_NAMES.get(number, "syscall<%d>" % number)
+
+
+def format_record(record, start):
+    arguments = ", ".join(repr(argument) for argument in record.arguments)
+    line = "%+.6f %d %s(%s)" % (record.timestamp - start, record.pid, syscall_name(record.number), arguments)
+    if record.prevented:
+        line += " = %s" % T.bold(str(record.return_value))
+    if record.kind is not None:
+        line += "  %s %s" % (getattr(T, COLORS.get(record.kind, "normal"))(record.kind.replace("_", " ")),
+                             T.underline(record.path))
+        if record.target is not None:
+            line += " -> %s" % T.underline(record.target)
+    elif record.description is not None:
+        line += "  " + record.description
+    return line
+
+
+GROUP_KEYS = {
+    "syscall": lambda record: syscall_name(record.number),
+    "pid": lambda record: str(record.pid),
+    "operation": lambda record: record.kind or record.description or "-",
+    "path": lambda record: record.path or "-",
+}
+
+
+def main(argv):
+    arg_parser = ArgumentParser(
+        prog="maybe report",
+        description=_("Query a recording of the syscalls intercepted while running a command, ") +
+                    _("made with maybe --record."),
+    )
+    arg_parser.add_argument("recording", metavar="FILE", help=_("recording to query"))
+    arg_parser.add_argument("--path", metavar="PATH",
+                            help=_("only show syscalls performing operations on %(metavar)s ") +
+                                 _("or files below it"))
+    arg_parser.add_argument("--pid", type=int, nargs="+", metavar="PID",
+                            help=_("only show syscalls made by the specified thread(s)"))
+    arg_parser.add_argument("--syscall", nargs="+", metavar="NAME",
+                            help=_("only show the specified syscall(s)"))
+    arg_parser.add_argument("--prevented", action="store_true",
+                            help=_("only show syscalls that have been prevented"))
+    arg_parser.add_argument("--group-by", choices=sorted(GROUP_KEYS),
+                            help=_("instead of listing syscalls, count them by the specified property"))
+    arg_parser.add_argument("--style-output", choices=["yes", "no", "auto"], default="auto",
+                            help=_("colorize output using ANSI escape sequences (yes/no) ") +
+                                 _("or automatically decide based on whether stdout is a terminal (auto, default)"))
+    args = arg_parser.parse_args(argv)
+
+    initialize_terminal(args.style_output)
+
+    try:
+        recording = Recording(args.recording)
+    except (IOError, OSError, ValueError) as error:
+        print(T.red(_("Error reading %s: %s.") % (T.bold(args.recording) + T.red, error)))
+        return 1
+
+    try:
+        # Paths are looked up in the index, if there is one
+        records = recording.records_below(abspath(args.path)) if args.path is not None else iter(recording)
+        syscalls = set(args.syscall) if args.syscall is not None else None
+        pids = set(args.pid) if args.pid is not None else None
+        records = (record for record in records
+                   if (syscalls is None or syscall_name(record.number) in syscalls) and
+                   (pids is None or record.pid in pids) and
+                   (record.prevented or not args.prevented))
+
+        if args.group_by is not None:
+            counts = Counter(GROUP_KEYS[args.group_by](record) for record in records)
+            for key, count in counts.most_common():
+                print("%8d %s" % (count, key))
+        else:
+            start = None
+            for record in records:
+                if start is None:
+                    start = next(iter(recording)).timestamp
+                print(format_record(record, start))
+    finally:
+        recording.close()
@@ -0,0 +1,260 @@
+# maybe - see what a program does before deciding whether you really want it to happen
+#
+# Copyright (c) 2016-2017 Philipp Emanuel Weidmann <pew@worldwidemann.com>
+#
+# Nemo vir est qui mundum non reddat meliorem.
+#
+# Released under the terms of the GNU General Public License, version 3
+# (https://gnu.org/licenses/gpl.html)
+
+
+# Binary recordings of the syscalls intercepted while tracing a command (--record),
+# which can be queried later (maybe report) without rerunning the command.
+#
+# A recording starts with MAGIC, followed by one record per syscall. Each record starts
+# with RECORD_HEADER, whose first field is the size of the whole record, so records can be
+# skipped without decoding them. The header is followed by the kind, path and target of the
+# operation the filter has returned (if any), or its description (for plugins returning strings),
+# and then by the arguments of the syscall. Once tracing is done, an index of the paths
+# of all operations, sorted by path, is appended, followed by INDEX_TRAILER, which holds
+# the offset of the index. Recordings without an index (e.g. because maybe has been killed)
+# can still be read, but queries for paths then have to look at every record.
+
+import sys
+from time import time
+from bisect import bisect_left
+from mmap import mmap, ACCESS_READ
+from struct import Struct
+from collections import namedtuple
+
+from six import PY2, string_types, binary_type
+
+
+MAGIC = b"MAYBEREC\x01"
+
+# Size, timestamp, thread ID, syscall number, return value, flags, number of arguments
+RECORD_HEADER = Struct("=IdiiqBB")
+# Flags
+PREVENTED = 1
+HAS_OPERATION = 2
+HAS_DESCRIPTION = 4
+
+STRING_LENGTH = Struct("=I")
+SIGNED_ARGUMENT = Struct("=q")
+UNSIGNED_ARGUMENT = Struct("=Q")
+
+# Offset of the path in the recording, length of the path, offset of the record
+INDEX_ENTRY = Struct("=QIQ")
+# Number of index entries, offset of the index, magic
+INDEX_TRAILER = Struct("=QQ8s")
+INDEX_MAGIC = b"MAYBEIDX"
+
+Record = namedtuple("Record", ["offset", "timestamp", "pid", "number", "return_value", "prevented",
+                               "kind", "path", "target", "description", "arguments"])
+
+
+def encode(string):
+    if PY2:
+        return string.encode("utf-8") if not isinstance(string, binary_type) else string
+    # Filenames that aren't valid in the file system encoding are preserved
+    return string.encode(sys.getfilesystemencoding(), "surrogateescape")
+
+
+def decode(data):
+    if PY2:
+        return data.decode("utf-8")
+    return data.decode(sys.getfilesystemencoding(), "surrogateescape")
+
+
+class Recorder(object):
+    def __init__(self):
+        self._file = None
+        # Offsets of the paths in the recording, their lengths, and offsets of their records
+        self._index = []
+
+    @property
+    def active(self):
+        return self._file is not None
+
+    def open(self, recording_path):
+        # Only needed while recording
+        from .seccomp import SYSCALL_NUMBERS
+        self._syscall_numbers = SYSCALL_NUMBERS
+        self._file = open(recording_path, "wb")
+        self._file.write(MAGIC)
+        self._offset = len(MAGIC)
+        self._index = []
+
+    def record(self, pid, number, arguments, operation, return_value):
+        flags = 0 if return_value is None else PREVENTED
+        body = []
+        paths = []
+        offset = RECORD_HEADER.size
+
+        def add_string(string, indexed=False):
+            data = encode(string)
+            if indexed and data:
+                paths.append((offset + STRING_LENGTH.size, len(data)))
+            body.append(STRING_LENGTH.pack(len(data)))
+            body.append(data)
+            return offset + STRING_LENGTH.size + len(data)
+
+        if isinstance(operation, string_types):
+            flags |= HAS_DESCRIPTION
+            offset = add_string(operation)
+        elif operation is not None:
+            flags |= HAS_OPERATION
+            offset = add_string(operation.kind)
+            offset = add_string(operation.path, True)
+            offset = add_string(operation.target or "", True)
+
+        for argument in arguments:
+            if isinstance(argument, string_types):
+                body.append(b"s")
+                offset = add_string(argument) + 1
+            elif argument >= 2**63:
+                body.append(b"u" + UNSIGNED_ARGUMENT.pack(argument))
+                offset += 1 + UNSIGNED_ARGUMENT.size
+            else:
+                body.append(b"i" + SIGNED_ARGUMENT.pack(argument))
+                offset += 1 + SIGNED_ARGUMENT.size
+
+        self._file.write(RECORD_HEADER.pack(offset, time(), pid, number, return_value or 0, flags, len(arguments)))
+        self._file.write(b"".join(body))
+        for path_offset, path_length in paths:
+            self._index.append((self._offset + path_offset, path_length, self._offset))
+        self._offset += offset
+
+    # Records a syscall by name, like EVENTS.syscall
+    def syscall(self, pid, name, arguments, operation, return_value):
+        self.record(pid, self._syscall_numbers[name], arguments, operation, return_value)
+
+    def close(self):
+        if self._file is None:
+            return
+        # Paths are only known to the file, so the index has to be sorted by reading them back
+        self._file.flush()
+        with open(self._file.name, "rb") as recording:
+            def path(entry):
+                recording.seek(entry[0])
+                return recording.read(entry[1])
+            self._index.sort(key=path)
+        for entry in self._index:
+            self._file.write(INDEX_ENTRY.pack(*entry))
+        self._file.write(INDEX_TRAILER.pack(len(self._index), self._offset, INDEX_MAGIC))
+        self._file.close()
+        self._file = None
+        self._index = []
+
+
+RECORDER = Recorder()
+
+
+# Sequence of the paths in the index, so it can be searched with bisect
+class _IndexPaths(object):
+    def __init__(self, recording):
+        self._recording = recording
+
+    def __len__(self):
+        return self._recording.index_size
+
+    def __getitem__(self, i):
+        return self._recording.index_path(i)
+
+
+# Read-only view of a recording, which is mapped into memory rather than read
+class Recording(object):
+    def __init__(self, recording_path):
+        with open(recording_path, "rb") as recording_file:
+            self._data = mmap(recording_file.fileno(), 0, access=ACCESS_READ)
+        if self._data[:len(MAGIC)] != MAGIC:
+            self._data.close()
+            raise ValueError("not a recording made by maybe")
+        self.index_size = 0
+        self._end = len(self._data)
+        if self._end >= len(MAGIC) + INDEX_TRAILER.size:
+            index_size, index_offset, index_magic = INDEX_TRAILER.unpack_from(self._data,
+                                                                              self._end - INDEX_TRAILER.size)
+            if index_magic == INDEX_MAGIC:
+                self.index_size = index_size
+                self._index_offset = index_offset
+                self._end = index_offset
+        self.indexed = self._end != len(self._data)
+
+    def close(self):
+        self._data.close()
+
+    def _string(self, offset):
+        length = STRING_LENGTH.unpack_from(self._data, offset)[0]
+        start = offset + STRING_LENGTH.size
+        return decode(self._data[start:start + length]), start + length
+
+    def record(self, offset):
+        size, timestamp, pid, number, return_value, flags, argument_count = RECORD_HEADER.unpack_from(self._data,
+                                                                                                      offset)
+        position = offset + RECORD_HEADER.size
+        kind = path = target = description = None
+        if flags & HAS_DESCRIPTION:
+            description, position = self._string(position)
+        if flags & HAS_OPERATION:
+            kind, position = self._string(position)
+            path, position = self._string(position)
+            target, position = self._string(position)
+        arguments = []
+        for i in range(argument_count):
+            tag = self._data[position:position + 1]
+            if tag == b"s":
+                argument, position = self._string(position + 1)
+            elif tag == b"u":
+                argument = UNSIGNED_ARGUMENT.unpack_from(self._data, position + 1)[0]
+                position += 1 + UNSIGNED_ARGUMENT.size
+            else:
+                argument = SIGNED_ARGUMENT.unpack_from(self._data, position + 1)[0]
+                position += 1 + SIGNED_ARGUMENT.size
+            arguments.append(argument)
+        return Record(offset, timestamp, pid, number, return_value if flags & PREVENTED else None,
+                      bool(flags & PREVENTED), kind, path, target or None, description, arguments)
+
+    # Yields all records, in the order in which the syscalls have been made
+    def __iter__(self):
+        offset = len(MAGIC)
+        while offset + RECORD_HEADER.size <= self._end:
+            size = RECORD_HEADER.unpack_from(self._data, offset)[0]
+            if offset + size > self._end:
+                # Incomplete record at the end of a recording that hasn't been closed
+                break
+            yield self.record(offset)
+            offset += size
+
+    def index_path(self, i):
+        path_offset, path_length, record_offset = INDEX_ENTRY.unpack_from(self._data,
+                                                                          self._index_offset + i * INDEX_ENTRY.size)
+        return self._data[path_offset:path_offset + path_length]
+
+    # Yields the records of operations on path or files below it, in the order of their paths
+    # (or, if the recording has no index, in the order in which the syscalls have been made)
+    def records_below(self, path):
+        path = encode(path.rstrip("/"))
+        if not self.indexed:
+            for record in self:
+                for record_path in (record.path, record.target):
+                    if record_path is not None and self._below(encode(record_path), path):
+                        yield record
+                        break
+            return
+        seen = set()
+        i = bisect_left(_IndexPaths(self), path)
+        while i < self.index_size:
+            path_offset, path_length, record_offset = INDEX_ENTRY.unpack_from(
+                self._data, self._index_offset + i * INDEX_ENTRY.size)
+            if not self._data[path_offset:path_offset + path_length].startswith(path):
+                break
+            if self._below(self._data[path_offset:path_offset + path_length], path) and record_offset not in seen:
+                # Moves and links are indexed by both of their paths
+                seen.add(record_offset)
+                yield self.record(record_offset)
+            i += 1
+
+    @staticmethod
+    def _below(record_path, path):
+        return record_path == path or record_path.startswith(path + b"/") or path == b""
@@ -0,0 +1,176 @@
+# maybe - see what a program does before deciding whether you really want it to happen
+#
+# Copyright (c) 2016-2017 Philipp Emanuel Weidmann <pew@worldwidemann.com>
+#
+# Nemo vir est qui mundum non reddat meliorem.
+#
+# Released under the terms of the GNU General Public License, version 3
+# (https://gnu.org/licenses/gpl.html)
+
+
+from errno import EIO, EINVAL
+from ctypes import Structure, Union, c_uint8, c_uint32, c_uint64, c_int64, addressof, sizeof
+
+from ptrace import PtraceError
+from ptrace.binding import ptrace_getregs, ptrace_setregs, ptrace_peekuser, ptrace_registers_t
+from ptrace.binding.func import ptrace
+from ptrace.binding.cpu import CPU_STACK_POINTER
+from ptrace.ctypes_tools import ulong2long
+from ptrace.syscall import SYSCALL_REGISTER, RETURN_VALUE_REGISTER
+
+from .arguments import register_values
+
+
+# Since Linux 5.3
+PTRACE_GET_SYSCALL_INFO = 0x420e
+
+PTRACE_SYSCALL_INFO_NONE = 0
+PTRACE_SYSCALL_INFO_ENTRY = 1
+PTRACE_SYSCALL_INFO_EXIT = 2
+PTRACE_SYSCALL_INFO_SECCOMP = 3
+
+
+class ptrace_syscall_info_entry(Structure):
+    _fields_ = [
+        ("nr", c_uint64),
+        ("args", c_uint64 * 6),
+    ]
+
+
+class ptrace_syscall_info_exit(Structure):
+    _fields_ = [
+        ("rval", c_int64),
+        ("is_error", c_uint8),
+    ]
+
+
+class ptrace_syscall_info_seccomp(Structure):
+    _fields_ = [
+        ("nr", c_uint64),
+        ("args", c_uint64 * 6),
+        ("ret_data", c_uint32),
+    ]
+
+
+class ptrace_syscall_info_data(Union):
+    _fields_ = [
+        ("entry", ptrace_syscall_info_entry),
+        ("exit", ptrace_syscall_info_exit),
+        ("seccomp", ptrace_syscall_info_seccomp),
+    ]
+
+
+class ptrace_syscall_info(Structure):
+    _fields_ = [
+        ("op", c_uint8),
+        ("pad", c_uint8 * 3),
+        ("arch", c_uint32),
+        ("instruction_pointer", c_uint64),
+        ("stack_pointer", c_uint64),
+        ("data", ptrace_syscall_info_data),
+    ]
+
+
+SYSCALL_REGISTER_OFFSET = getattr(ptrace_registers_t, SYSCALL_REGISTER).offset
+
+# Whether PTRACE_GET_SYSCALL_INFO is available, which is only known once it has been tried
+_syscall_info_available = True
+
+
+# Returns the number of the syscall the thread is about to execute with a single PTRACE_PEEKUSER,
+# which (unlike Registers) allocates nothing for the many syscalls that are only looked up to be let through
+def syscall_number(pid):
+    return ptrace_peekuser(pid, SYSCALL_REGISTER_OFFSET)
+
+
+# Registers of a thread stopped at a syscall. The syscall is read with a single ptrace call
+# (PTRACE_GET_SYSCALL_INFO if available, PTRACE_GETREGS otherwise), and changes to registers
+# are collected and written back with a single PTRACE_SETREGS by flush.
+class Registers(object):
+    def __init__(self, pid):
+        self.pid = pid
+        self._info = None
+        self._regs = None
+        self._changed = False
+        # Maps argument registers changed by set_argument to their original values (if any have been changed)
+        self.replaced = None
+
+    def _syscall_info(self):
+        global _syscall_info_available
+        if self._info is None and _syscall_info_available:
+            info = ptrace_syscall_info()
+            try:
+                ptrace(PTRACE_GET_SYSCALL_INFO, self.pid, sizeof(info), addressof(info))
+            except PtraceError as error:
+                # Other errors (like ESRCH if the thread has been killed) don't mean anything about the kernel
+                if error.errno not in (EIO, EINVAL):
+                    raise
+                # Kernel is older than 5.3
+                _syscall_info_available = False
+                return None
+            self._info = info
+        return self._info
+
+    def _registers(self):
+        if self._regs is None:
+            self._regs = ptrace_getregs(self.pid)
+        return self._regs
+
+    # Returns the number of the syscall the thread is about to execute, and the values of its arguments
+    def syscall(self):
+        info = self._syscall_info()
+        if info is not None:
+            if info.op == PTRACE_SYSCALL_INFO_ENTRY:
+                return info.data.entry.nr, list(info.data.entry.args)
+            if info.op == PTRACE_SYSCALL_INFO_SECCOMP:
+                return info.data.seccomp.nr, list(info.data.seccomp.args)
+        regs = self._registers()
+        return getattr(regs, SYSCALL_REGISTER), register_values(regs)
+
+    # Returns the values of the arguments of the syscall the thread is about to execute
+    def arguments(self):
+        return self.syscall()[1]
+
+    # Returns the result of the syscall the thread has just executed
+    def return_value(self):
+        info = self._syscall_info()
+        if info is not None and info.op == PTRACE_SYSCALL_INFO_EXIT:
+            return info.data.exit.rval
+        return ulong2long(getattr(self._registers(), RETURN_VALUE_REGISTER))
+
+    def stack_pointer(self):
+        info = self._syscall_info()
+        if info is not None and info.op != PTRACE_SYSCALL_INFO_NONE:
+            return info.stack_pointer
+        return getattr(self._registers(), CPU_STACK_POINTER)
+
+    def set(self, name, value):
+        setattr(self._registers(), name, value)
+        self._changed = True
+
+    # Changes an argument register for the syscall the thread is about to execute. Its original value
+    # has to be restored (with restore) once the syscall has been executed, since, like the kernel,
+    # maybe must leave argument registers unchanged.
+    def set_argument(self, name, value):
+        if self.replaced is None:
+            self.replaced = {}
+        # The register holding the return value is overwritten by the syscall anyway (e.g. on ARM)
+        if name not in self.replaced and name != RETURN_VALUE_REGISTER:
+            self.replaced[name] = getattr(self._registers(), name)
+        self.set(name, value)
+
+    # Restores registers replaced by set_argument (after the syscall has been executed)
+    def restore(self, replaced):
+        for name, value in replaced.items():
+            self.set(name, value)
+
+    def flush(self):
+        if self._changed:
+            ptrace_setregs(self.pid, self._regs)
+            self._changed = False
+
+    # Makes the syscall appear to have returned return_value without executing it
+    def prevent_syscall(self, return_value):
+        # Invalid syscall number
+        self.set(SYSCALL_REGISTER, -1)
+        self.set(RETURN_VALUE_REGISTER, return_value)
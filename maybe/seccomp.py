@@ -0,0 +1,186 @@
+# maybe - see what a program does before deciding whether you really want it to happen
+#
+# Copyright (c) 2016-2017 Philipp Emanuel Weidmann <pew@worldwidemann.com>
+#
+# Nemo vir est qui mundum non reddat meliorem.
+#
+# Released under the terms of the GNU General Public License, version 3
+# (https://gnu.org/licenses/gpl.html)
+
+
+import pickle
+from os import fork, execv, pipe, read, write, close, closerange, access, strerror, _exit, X_OK
+from os.path import exists
+from fcntl import fcntl, F_GETFD, F_SETFD, FD_CLOEXEC
+from errno import ENOENT, EACCES, ENOSYS
+from ctypes import (CDLL, Structure, POINTER, c_ushort, c_ubyte, c_uint, c_int, c_long, c_ulong,
+                    c_int32, c_uint32, c_int64, c_uint64, get_errno, addressof)
+
+from ptrace.binding import ptrace_traceme
+from ptrace.cpu_info import CPU_X86_64, CPU_I386, CPU_ARM
+from ptrace.debugger import ChildError
+from ptrace.debugger.child import MAXFD
+
+# Includes the syscalls missing from python-ptrace's tables
+from .arguments import SYSCALL_NAMES
+
+
+PR_SET_NO_NEW_PRIVS = 38
+PR_SET_SECCOMP = 22
+SECCOMP_MODE_FILTER = 2
+
+SECCOMP_SET_MODE_FILTER = 1
+SECCOMP_FILTER_FLAG_NEW_LISTENER = 1 << 3
+
+SECCOMP_RET_ALLOW = 0x7fff0000
+SECCOMP_RET_TRACE = 0x7ff00000
+SECCOMP_RET_USER_NOTIF = 0x7fc00000
+SECCOMP_RET_ERRNO = 0x00050000
+
+SECCOMP_USER_NOTIF_FLAG_CONTINUE = 1
+
+SECCOMP_IOCTL_NOTIF_RECV = 0xc0502100
+SECCOMP_IOCTL_NOTIF_SEND = 0xc0182101
+SECCOMP_IOCTL_NOTIF_ID_VALID = 0x40082102
+
+PTRACE_O_TRACESECCOMP = 0x80
+PTRACE_EVENT_SECCOMP = 7
+
+# Classic BPF opcodes (see linux/filter.h)
+BPF_LD_W_ABS = 0x20
+BPF_JMP_JEQ_K = 0x15
+BPF_JMP_JGE_K = 0x35
+BPF_RET_K = 0x06
+
+# Offsets into struct seccomp_data (see linux/seccomp.h)
+SECCOMP_DATA_NR = 0
+SECCOMP_DATA_ARCH = 4
+
+# Set in the numbers of syscalls made through the x32 ABI (which shares its AUDIT_ARCH with x86_64)
+X32_SYSCALL_BIT = 0x40000000
+
+# See linux/audit.h and the architectures' syscall tables
+if CPU_X86_64:
+    AUDIT_ARCH = 0xc000003e
+    SYS_SECCOMP = 317
+elif CPU_I386:
+    AUDIT_ARCH = 0x40000003
+    SYS_SECCOMP = 354
+elif CPU_ARM:
+    AUDIT_ARCH = 0x40000028
+    SYS_SECCOMP = 383
+else:
+    AUDIT_ARCH = None
+    SYS_SECCOMP = None
+
+SYSCALL_NUMBERS = dict((name, number) for number, name in SYSCALL_NAMES.items())
+
+libc = CDLL(None, use_errno=True)
+
+
+class sock_filter(Structure):
+    _fields_ = [("code", c_ushort), ("jt", c_ubyte), ("jf", c_ubyte), ("k", c_uint)]
+
+
+class sock_fprog(Structure):
+    _fields_ = [("len", c_ushort), ("filter", POINTER(sock_filter))]
+
+
+class seccomp_data(Structure):
+    _fields_ = [("nr", c_int), ("arch", c_uint32), ("instruction_pointer", c_uint64), ("args", c_uint64 * 6)]
+
+
+class seccomp_notif(Structure):
+    _fields_ = [("id", c_uint64), ("pid", c_uint32), ("flags", c_uint32), ("data", seccomp_data)]
+
+
+class seccomp_notif_resp(Structure):
+    _fields_ = [("id", c_uint64), ("val", c_int64), ("error", c_int32), ("flags", c_uint32)]
+
+
+def compile_filter(syscalls, action=SECCOMP_RET_TRACE):
+    if AUDIT_ARCH is None:
+        raise NotImplementedError("seccomp filtering is not supported on this architecture")
+    numbers = sorted(set(SYSCALL_NUMBERS[syscall] for syscall in syscalls if syscall in SYSCALL_NUMBERS))
+    # Syscalls made through a foreign ABI (e.g. by 32-bit programs) have different numbers and arguments,
+    # which the filters don't know about. Rather than letting them through unchecked, they are failed
+    # as if the kernel didn't support the ABI.
+    foreign_abi = SECCOMP_RET_ERRNO | ENOSYS
+    program = [
+        (BPF_LD_W_ABS, 0, 0, SECCOMP_DATA_ARCH),
+        (BPF_JMP_JEQ_K, 1, 0, AUDIT_ARCH),
+        (BPF_RET_K, 0, 0, foreign_abi),
+        (BPF_LD_W_ABS, 0, 0, SECCOMP_DATA_NR),
+        (BPF_JMP_JGE_K, 0, 1, X32_SYSCALL_BIT),
+        (BPF_RET_K, 0, 0, foreign_abi),
+    ]
+    for i, number in enumerate(numbers):
+        # On match, jump over the remaining comparisons and the "allow" instruction
+        program.append((BPF_JMP_JEQ_K, len(numbers) - i, 0, number))
+    program.append((BPF_RET_K, 0, 0, SECCOMP_RET_ALLOW))
+    program.append((BPF_RET_K, 0, 0, action))
+    return program
+
+
+def install_filter(program, listener=False):
+    instructions = (sock_filter * len(program))(*[sock_filter(*instruction) for instruction in program])
+    fprog = sock_fprog(len(program), instructions)
+    # Without CAP_SYS_ADMIN, the kernel only accepts filters from processes
+    # that can no longer gain privileges (which ptrace prevents anyway)
+    if libc.prctl(PR_SET_NO_NEW_PRIVS, c_ulong(1), c_ulong(0), c_ulong(0), c_ulong(0)) != 0:
+        result = -1
+    elif listener:
+        # Returns a file descriptor from which SECCOMP_RET_USER_NOTIF notifications can be received
+        result = libc.syscall(c_long(SYS_SECCOMP), c_ulong(SECCOMP_SET_MODE_FILTER),
+                              c_ulong(SECCOMP_FILTER_FLAG_NEW_LISTENER), c_ulong(addressof(fprog)))
+    else:
+        result = libc.prctl(PR_SET_SECCOMP, c_ulong(SECCOMP_MODE_FILTER), c_ulong(addressof(fprog)),
+                            c_ulong(0), c_ulong(0))
+    if result < 0:
+        errno = get_errno()
+        raise OSError(errno, strerror(errno))
+    return result
+
+
+def check_executable(path):
+    # Once the filter is active, filtered syscalls cannot be served until the parent
+    # is ready for them, so obvious reasons for exec to fail are checked beforehand
+    if not access(path, X_OK):
+        errno = EACCES if exists(path) else ENOENT
+        raise ChildError(str(OSError(errno, strerror(errno))))
+
+
+def create_child(arguments, program=None):
+    # Equivalent to python-ptrace's createChild (which closes file descriptors one by one,
+    # taking a while if many can be open), except that the seccomp filter (if any) is installed
+    # right before the program is executed. Once the filter is active, filtered syscalls fail
+    # until the tracer has enabled PTRACE_O_TRACESECCOMP, so errors can only be reported up to that point.
+    check_executable(arguments[0])
+
+    error_read, error_write = pipe()
+    # Closing the pipe explicitly might itself be a filtered syscall
+    fcntl(error_write, F_SETFD, fcntl(error_write, F_GETFD) | FD_CLOEXEC)
+    pid = fork()
+
+    if pid:
+        close(error_write)
+        data = read(error_read, 1048576)
+        close(error_read)
+        if data:
+            raise pickle.loads(data)
+        return pid
+
+    close(error_read)
+    try:
+        ptrace_traceme()
+        closerange(3, error_write)
+        closerange(error_write + 1, MAXFD)
+        if program is not None:
+            install_filter(program)
+    except Exception as error:
+        write(error_write, pickle.dumps(ChildError(str(error))))
+        _exit(255)
+    try:
+        execv(arguments[0], arguments)
+    finally:
+        _exit(255)
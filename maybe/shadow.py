@@ -0,0 +1,152 @@
+# maybe - see what a program does before deciding whether you really want it to happen
+#
+# Copyright (c) 2016-2017 Philipp Emanuel Weidmann <pew@worldwidemann.com>
+#
+# Nemo vir est qui mundum non reddat meliorem.
+#
+# Released under the terms of the GNU General Public License, version 3
+# (https://gnu.org/licenses/gpl.html)
+
+
+from os import stat
+from os.path import join
+from stat import S_ISDIR, S_IFREG, S_IFDIR, S_IFIFO, S_IFSOCK, S_IFCHR, S_IFBLK
+
+from six import string_types
+
+
+# Modes of files that are created by operations (the umask is not known here)
+CREATED_MODES = {
+    "create_file": S_IFREG | 0o644,
+    "create_directory": S_IFDIR | 0o755,
+    "create_named_pipe": S_IFIFO | 0o644,
+    "create_socket": S_IFSOCK | 0o755,
+    "create_character_special_file": S_IFCHR | 0o644,
+    "create_block_special_file": S_IFBLK | 0o644,
+}
+
+# Mode of files that don't exist
+MISSING = 0
+
+
+class _Node(object):
+    __slots__ = ("children", "mode", "source")
+
+    def __init__(self, mode=None):
+        # Maps names to nodes
+        self.children = {}
+        # None if not yet known
+        self.mode = mode
+        # Path on the real file system where files in this subtree whose modes are not yet known
+        # can be found, if different from their paths (e.g. because the subtree has been moved),
+        # or EMPTY if there are no such files (e.g. because the subtree has been created)
+        self.source = None
+
+
+EMPTY = ""
+
+
+# Trie of paths, holding the modes of files as they would be if the operations
+# prevented by filters had been performed. Modes of files that haven't been touched
+# by such operations are read from the real file system when they are first needed.
+# They are only kept in the trie (until an operation or forget replaces them) if caching
+# is set, since syscalls that are executed because their filters are disabled change them
+# without the trie being told.
+class ShadowFilesystem(object):
+    def __init__(self):
+        self._root = _Node()
+        self.caching = False
+
+    # Forgets everything, e.g. before another command is run
+    def clear(self, caching=False):
+        self._root = _Node()
+        self.caching = caching
+
+    # Returns the node for path (or None if path cannot exist because one of its ancestors
+    # is not a directory), and the real path of the file (or EMPTY if there is none).
+    # Unless create is set, paths that aren't in the trie get a node that isn't part of it.
+    def _find(self, path, create=False):
+        names = [name for name in path.split("/") if name]
+        node = self._root
+        real_path = path
+        for i, name in enumerate(names):
+            if node.mode is not None and not S_ISDIR(node.mode):
+                return None, EMPTY
+            if node.source is not None:
+                real_path = join(node.source, *names[i:]) if node.source != EMPTY else EMPTY
+            if name not in node.children:
+                if not create:
+                    return _Node(), real_path
+                node.children[name] = _Node()
+            node = node.children[name]
+        if node.source is not None:
+            real_path = node.source
+        return node, real_path
+
+    # Returns the mode (as in st_mode) of the file at path, or MISSING if it doesn't exist
+    def mode(self, path):
+        node, real_path = self._find(path, self.caching)
+        if node is None:
+            return MISSING
+        if node.mode is not None:
+            return node.mode
+        mode = MISSING
+        if real_path != EMPTY:
+            try:
+                mode = stat(real_path).st_mode
+            except (IOError, OSError):
+                pass
+        if self.caching:
+            node.mode = mode
+        return mode
+
+    def exists(self, path):
+        return self.mode(path) != MISSING
+
+    def _set(self, path, mode, source=EMPTY):
+        node = self._find(path, True)[0]
+        if node is not None:
+            node.mode = mode
+            node.children = {}
+            node.source = source
+        return node
+
+    # Forgets what is known about path and the files below it, e.g. because they are
+    # about to be changed on the real file system
+    def forget(self, path):
+        node = self._find(path)[0]
+        if node is not None:
+            node.mode = None
+            node.children = {}
+            node.source = None
+
+    # Updates the modes of the files affected by the operation
+    def update(self, operation):
+        if isinstance(operation, string_types):
+            return
+        kind, path = operation.kind, operation.path
+        if kind in CREATED_MODES:
+            mode = CREATED_MODES[kind]
+            if operation.mode is not None:
+                mode = (mode & ~0o7777) | operation.mode
+            self._set(path, mode)
+        elif kind == "delete":
+            self._set(path, MISSING)
+        elif kind == "change_permissions":
+            mode = self.mode(path)
+            if mode != MISSING:
+                self._find(path, True)[0].mode = (mode & ~0o7777) | operation.mode
+        elif kind in ("create_symbolic_link", "create_hard_link"):
+            # Like os.path.exists, symbolic links are followed
+            self._set(path, self.mode(operation.target))
+        elif kind == "move":
+            mode = self.mode(path)
+            if mode != MISSING:
+                node, real_path = self._find(path)
+                target_node = self._set(operation.target, mode, real_path)
+                if target_node is not None:
+                    target_node.children = node.children
+                self._set(path, MISSING)
+
+
+FILESYSTEM = ShadowFilesystem()
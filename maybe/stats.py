@@ -0,0 +1,126 @@
+# maybe - see what a program does before deciding whether you really want it to happen
+#
+# Copyright (c) 2016-2017 Philipp Emanuel Weidmann <pew@worldwidemann.com>
+#
+# Nemo vir est qui mundum non reddat meliorem.
+#
+# Released under the terms of the GNU General Public License, version 3
+# (https://gnu.org/licenses/gpl.html)
+
+
+from time import time
+from timeit import default_timer as timer
+from collections import Counter
+from resource import getrusage, RUSAGE_SELF, RUSAGE_CHILDREN
+
+
+# Key under which stops at syscalls that are neither filtered nor tracked are counted
+UNFILTERED = "<unfiltered>"
+
+
+def cpu_time(who):
+    usage = getrusage(who)
+    return usage.ru_utime + usage.ru_stime
+
+
+# Where maybe spends its time while tracing a command. Nothing is counted unless enabled is set
+# (by --stats, or by a plugin), so the checks for it are all tracing pays otherwise.
+class Stats(object):
+    def __init__(self):
+        self.enabled = False
+        self.clear()
+
+    def clear(self):
+        # Maps syscalls to the number of times a process has been stopped at them (or, in notify mode,
+        # a notification has been received for them). Syscalls that are neither filtered nor tracked
+        # are counted together, as UNFILTERED.
+        self.stops = Counter()
+        # Maps syscalls to the number of times they have been intercepted, prevented and let through
+        self.intercepted = Counter()
+        self.prevented = Counter()
+        self.passed = Counter()
+        # Maps filters ("module:syscall") to the number of times they have been called, and the time spent in them
+        self.filter_calls = Counter()
+        self.filter_time = Counter()
+        # Time spent decoding syscall arguments (including reading filenames from the processes' memory)
+        self.decoded_arguments = 0
+        self.decoding_time = 0.0
+        # Maps the kinds of files in /proc (e.g. "cwd") to the number of times they have been read
+        self.procfs_lookups = Counter()
+        self.wall_time = 0.0
+        self.tracer_cpu_time = 0.0
+        self.tracee_cpu_time = 0.0
+        self._start = None
+
+    def start(self):
+        self._start = (time(), cpu_time(RUSAGE_SELF), cpu_time(RUSAGE_CHILDREN))
+
+    def stop(self):
+        if self._start is not None:
+            # Processes only count towards RUSAGE_CHILDREN once they have been waited for
+            self.wall_time += time() - self._start[0]
+            self.tracer_cpu_time += cpu_time(RUSAGE_SELF) - self._start[1]
+            self.tracee_cpu_time += cpu_time(RUSAGE_CHILDREN) - self._start[2]
+            self._start = None
+
+    # Calls filter_function, counting the call and the time spent in it
+    def call_filter(self, syscall, filter_function, process, arguments):
+        start = timer()
+        try:
+            return filter_function(process, arguments)
+        finally:
+            name = "%s:%s" % (getattr(filter_function, "__module__", None), syscall)
+            self.filter_calls[name] += 1
+            self.filter_time[name] += timer() - start
+
+    def count_stop(self, syscall):
+        self.stops[syscall if syscall is not None else UNFILTERED] += 1
+
+    def count_decision(self, syscall, return_value):
+        self.intercepted[syscall] += 1
+        if return_value is None:
+            self.passed[syscall] += 1
+        else:
+            self.prevented[syscall] += 1
+
+    def as_dict(self):
+        return {
+            "stops": dict(self.stops),
+            "syscalls": dict((syscall, {
+                "intercepted": self.intercepted[syscall],
+                "prevented": self.prevented[syscall],
+                "passed": self.passed[syscall],
+            }) for syscall in self.intercepted),
+            "filters": dict((name, {
+                "calls": self.filter_calls[name],
+                "time": self.filter_time[name],
+            }) for name in self.filter_calls),
+            "decoded_arguments": self.decoded_arguments,
+            "decoding_time": self.decoding_time,
+            "procfs_lookups": dict(self.procfs_lookups),
+            "wall_time": self.wall_time,
+            "tracer_cpu_time": self.tracer_cpu_time,
+            "tracee_cpu_time": self.tracee_cpu_time,
+        }
+
+    def format(self):
+        lines = [
+            "Stops: %d (%s)" % (sum(self.stops.values()),
+                                ", ".join("%s %d" % item for item in self.stops.most_common()) or "none"),
+            "Wall time: %.3f s, tracer CPU time: %.3f s, tracee CPU time: %.3f s" %
+            (self.wall_time, self.tracer_cpu_time, self.tracee_cpu_time),
+            "Decoded arguments: %d in %.3f s" % (self.decoded_arguments, self.decoding_time),
+            "Lookups in /proc: %s" % (", ".join("%s %d" % item for item in sorted(self.procfs_lookups.items()))
+                                      or "none"),
+            "",
+            "%-20s %12s %12s %12s" % ("Syscall", "Intercepted", "Prevented", "Passed"),
+        ]
+        for syscall, count in self.intercepted.most_common():
+            lines.append("%-20s %12d %12d %12d" % (syscall, count, self.prevented[syscall], self.passed[syscall]))
+        lines += ["", "%-40s %12s %12s" % ("Filter", "Calls", "Time (ms)")]
+        for name, time_spent in self.filter_time.most_common():
+            lines.append("%-40s %12d %12.3f" % (name, self.filter_calls[name], time_spent * 1000))
+        return "\n".join(lines)
+
+
+STATS = Stats()
@@ -0,0 +1,230 @@
+# maybe - see what a program does before deciding whether you really want it to happen
+#
+# Copyright (c) 2016-2017 Philipp Emanuel Weidmann <pew@worldwidemann.com>
+#
+# Nemo vir est qui mundum non reddat meliorem.
+#
+# Released under the terms of the GNU General Public License, version 3
+# (https://gnu.org/licenses/gpl.html)
+
+
+# Tracing core used in place of python-ptrace's PtraceDebugger, which waits for each traced
+# process in turn (sleeping in between once there is more than one), and reports everything
+# but signals by raising exceptions. Here, the events of all threads are received with
+# a single waitpid(-1, __WALL), and returned as Event tuples.
+
+from os import waitpid, kill, WIFSTOPPED, WSTOPSIG, WIFEXITED, WIFSIGNALED, WNOHANG
+from signal import SIGTRAP, SIGKILL
+from errno import ECHILD, ESRCH
+from collections import namedtuple
+
+from six import get_unbound_function
+from ptrace.binding import (ptrace_setoptions, ptrace_geteventmsg,
+                            PTRACE_EVENT_FORK, PTRACE_EVENT_VFORK, PTRACE_EVENT_CLONE, PTRACE_EVENT_EXEC)
+from ptrace.debugger import PtraceProcess, ChildError
+
+from .seccomp import PTRACE_EVENT_SECCOMP
+
+
+# __WALL: waits for threads as well as processes
+WALL = 0x40000000
+
+PTRACE_O_TRACESYSGOOD = 0x1
+PTRACE_O_TRACEFORK = 0x2
+PTRACE_O_TRACEVFORK = 0x4
+PTRACE_O_TRACECLONE = 0x8
+PTRACE_O_TRACEEXEC = 0x10
+# Kills all processes being traced if maybe itself is killed, instead of letting them run unchecked
+PTRACE_O_EXITKILL = 0x100000
+
+# With PTRACE_O_TRACESYSGOOD, syscall stops are told apart from SIGTRAP being delivered
+SYSCALL_SIGNAL = SIGTRAP | 0x80
+
+# Kinds of events
+SYSCALL = "syscall"
+SECCOMP = "seccomp"
+SIGNAL = "signal"
+NEW_PROCESS = "new_process"
+EXECUTION = "execution"
+EXIT = "exit"
+
+# "detail" is the signal for SIGNAL events, and the thread ID the thread had before
+# for EXECUTION events (which differs from its current one if it wasn't the thread group leader)
+Event = namedtuple("Event", ["kind", "thread", "detail"])
+
+
+# A traced thread. The methods for reading and changing its registers and memory are the same
+# as those of python-ptrace's PtraceProcess (so PtraceSyscall can decode its syscalls), but none
+# of the state kept for debugging is.
+class Thread(object):
+    def __init__(self, pid, parent=None, is_thread=False):
+        self.pid = pid
+        self.parent = parent
+        # Whether the thread has been created by clone (rather than fork or vfork)
+        self.is_thread = is_thread
+        # Whether the thread is stopped at (or running) a syscall it has entered, but not yet exited
+        self.in_syscall = False
+        self.read_mem_file = None
+
+    def close(self):
+        if self.read_mem_file is not None:
+            self.read_mem_file.close()
+            self.read_mem_file = None
+
+    def __repr__(self):
+        return "<Thread #%d>" % self.pid
+
+
+for _method in ["cont", "syscall", "filterSignal", "getregs", "getreg", "setregs", "setreg", "getStackPointer",
+                "getInstrPointer", "readBytes", "_readBytes", "readWord", "writeBytes", "writeWord",
+                "readStruct", "readArray", "readCString"]:
+    setattr(Thread, _method, get_unbound_function(getattr(PtraceProcess, _method)))
+
+
+class Tracer(object):
+    def __init__(self, options=0):
+        self.options = (options | PTRACE_O_TRACESYSGOOD | PTRACE_O_TRACEFORK | PTRACE_O_TRACEVFORK |
+                        PTRACE_O_TRACECLONE | PTRACE_O_TRACEEXEC | PTRACE_O_EXITKILL)
+        # Maps thread IDs to the threads being traced
+        self.threads = {}
+        # Maps the IDs of threads that have been created, but have not stopped yet, to their parents
+        # (and whether they have been created by clone)
+        self._unstopped_threads = {}
+        # IDs of threads that have stopped before their parents' events about them have been received
+        self._stopped_unknown_threads = set()
+        self._ptrace_event_handlers = {
+            PTRACE_EVENT_FORK: self._new_process,
+            PTRACE_EVENT_VFORK: self._new_process,
+            PTRACE_EVENT_CLONE: self._new_thread,
+            PTRACE_EVENT_EXEC: self._execution,
+            PTRACE_EVENT_SECCOMP: self._seccomp,
+        }
+
+    # Whether any threads are still being traced
+    def __bool__(self):
+        return bool(self.threads)
+
+    __nonzero__ = __bool__
+
+    # Starts tracing a child that has called PTRACE_TRACEME and is about to stop
+    # (or has stopped) with SIGTRAP after calling execve
+    def add_process(self, pid):
+        pid, status = waitpid(pid, WALL)
+        if not WIFSTOPPED(status):
+            raise ChildError("process %d has exited before it could be traced" % pid)
+        ptrace_setoptions(pid, self.options)
+        thread = Thread(pid)
+        self.threads[pid] = thread
+        return thread
+
+    # Returns the next event, or (unless blocking) None if there is none
+    def wait(self, blocking=True):
+        while True:
+            try:
+                pid, status = waitpid(-1, WALL if blocking else WALL | WNOHANG)
+            except OSError as error:
+                if error.errno != ECHILD or not self.threads:
+                    raise
+                # All threads have disappeared without being waited for
+                return self._exit(next(iter(self.threads)))
+            if pid == 0:
+                return None
+            event = self._handle_status(pid, status)
+            if event is not None:
+                return event
+
+    def _handle_status(self, pid, status):
+        if WIFEXITED(status) or WIFSIGNALED(status):
+            if pid in self._unstopped_threads:
+                # A thread has been killed before it has ever stopped, which its parent is waiting for.
+                # The parent is resumed as if it had been stopped by a signal, without delivering one.
+                parent, is_thread = self._unstopped_threads.pop(pid)
+                return Event(SIGNAL, parent, 0)
+            if pid in self.threads:
+                return self._exit(pid)
+            self._stopped_unknown_threads.discard(pid)
+            return None
+
+        if not WIFSTOPPED(status):
+            return None
+        thread = self.threads.get(pid)
+        if thread is None:
+            # New threads stop with SIGSTOP, which might be reported before or after the event of their parent
+            if pid in self._unstopped_threads:
+                parent, is_thread = self._unstopped_threads.pop(pid)
+                return self._add_thread(pid, parent, is_thread)
+            self._stopped_unknown_threads.add(pid)
+            return None
+
+        signum = WSTOPSIG(status)
+        if signum == SYSCALL_SIGNAL:
+            thread.in_syscall = not thread.in_syscall
+            return Event(SYSCALL, thread, None)
+        if signum == SIGTRAP and status >> 16:
+            return self._ptrace_event_handlers[status >> 16](thread)
+        return Event(SIGNAL, thread, signum)
+
+    def _add_thread(self, pid, parent, is_thread):
+        thread = Thread(pid, parent, is_thread)
+        self.threads[pid] = thread
+        return Event(NEW_PROCESS, thread, None)
+
+    def _new_process(self, parent, is_thread=False):
+        pid = ptrace_geteventmsg(parent.pid)
+        if pid in self._stopped_unknown_threads:
+            self._stopped_unknown_threads.remove(pid)
+            return self._add_thread(pid, parent, is_thread)
+        # The event is reported once the new thread has stopped
+        self._unstopped_threads[pid] = (parent, is_thread)
+        return None
+
+    def _new_thread(self, parent):
+        return self._new_process(parent, True)
+
+    def _execution(self, thread):
+        former_pid = ptrace_geteventmsg(thread.pid)
+        if former_pid != thread.pid:
+            # A thread other than the thread group leader has called execve, which gives it the ID of
+            # the leader (whose exit is not reported), and makes it forget about its former ID
+            pid = thread.pid
+            leader = self.threads.pop(pid)
+            leader.close()
+            thread = self.threads.pop(former_pid, leader)
+            thread.close()
+            thread.pid = pid
+            self.threads[pid] = thread
+        return Event(EXECUTION, thread, former_pid)
+
+    def _seccomp(self, thread):
+        # The syscall is stopped after it has been entered, and the next syscall stop is after it has been executed
+        thread.in_syscall = True
+        return Event(SECCOMP, thread, None)
+
+    def _exit(self, pid):
+        thread = self.threads.pop(pid)
+        thread.close()
+        return Event(EXIT, thread, None)
+
+    # Kills all threads being traced, and waits until they are gone
+    def quit(self):
+        for pid in list(self.threads) + list(self._unstopped_threads) + list(self._stopped_unknown_threads):
+            try:
+                kill(pid, SIGKILL)
+            except OSError as error:
+                if error.errno != ESRCH:
+                    raise
+        for pid in list(self.threads) + list(self._unstopped_threads) + list(self._stopped_unknown_threads):
+            while True:
+                try:
+                    waited_pid, status = waitpid(pid, WALL)
+                except OSError as error:
+                    if error.errno != ECHILD:
+                        raise
+                    break
+                if WIFEXITED(status) or WIFSIGNALED(status):
+                    break
+        for thread in self.threads.values():
+            thread.close()
+        self.threads = {}
+        self._unstopped_threads = {}
+        self._stopped_unknown_threads = set()
@@ -75,6 +75,8 @@ setup(
         "six==1.10.0",
         "blessings==1.6",
         "python-ptrace==0.9.1",
+        # concurrent.futures, for filters that decide in the background
+        "futures>=3.0.5; python_version < '3'",
     ],
 
     setup_requires=[
@@ -86,7 +88,9 @@ setup(
 
     entry_points={
         "console_scripts": [
-            "maybe = maybe.maybe:main",
+            "maybe = maybe.client:main",
+            "maybe-daemon = maybe.daemon:main",
+            "maybe-batch = maybe.batch:main",
         ],
     },
 
@@ -55,7 +55,7 @@ def remove(f):
             assert not f.check()
 
 
-def tf(directory, command, output, operation, test):
+def tf(directory, command, output, operation, test, options=""):
     def t_file(f, f_arg):
         # File does not yet exist (will be created when written to)
         assert not f.check()
@@ -64,10 +64,10 @@ def tf(directory, command, output, operation, test):
         assert test(f)
         cmd = command.format(f=f_arg)
         # Test for expected output and provided test condition
-        assert maybe("-l -- " + cmd) == to_unicode(output.format(f=f))
+        assert maybe(("-l %s -- " % options) + cmd) == to_unicode(output.format(f=f))
         assert test(f)
         # Test for negation of the above if operation is explicitly allowed
-        assert maybe(("-l -a %s -- " % operation) + cmd).startswith("maybe has not detected")
+        assert maybe(("-l %s -a %s -- " % (options, operation)) + cmd).startswith("maybe has not detected")
         assert not test(f)
 
     def t_name(name):
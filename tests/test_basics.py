@@ -1,15 +1,23 @@
 from ptrace.syscall import SYSCALL_PROTOTYPES
 
 from common import maybe
-from maybe import SYSCALL_FILTERS
+from maybe import SYSCALL_FILTERS, load_filters
+from maybe.filters import FILTER_MANIFEST
 
 
 def test_syscall_filters():
     # Verify that every filtered syscall is known to python-ptrace
-    for filter_scope in SYSCALL_FILTERS:
-        for syscall in SYSCALL_FILTERS[filter_scope]:
+    for filter_scope in FILTER_MANIFEST:
+        for syscall in FILTER_MANIFEST[filter_scope][1]:
             assert syscall in SYSCALL_PROTOTYPES
 
 
+def test_filter_manifest():
+    # Verify that the manifest lists the syscalls the modules register filters for
+    load_filters(FILTER_MANIFEST)
+    for filter_scope in FILTER_MANIFEST:
+        assert sorted(SYSCALL_FILTERS[filter_scope]) == sorted(FILTER_MANIFEST[filter_scope][1])
+
+
 def test_no_operations():
     assert maybe("true") == _("maybe has not detected any file system operations from true.")
@@ -0,0 +1,28 @@
+from maybe.batch import main
+
+from common import working_directory
+
+
+def test_batch(tmpdir, capsys):
+    tmpdir.join("f").write("abc")
+    tmpdir.join("manifest").write("# comment\n\nrm f\nsh -c \"echo abc > f\"\ntouch g\n")
+    with working_directory(tmpdir):
+        assert main(["-j", "2", "manifest"]) == 0
+    assert capsys.readouterr()[0].splitlines() == [
+        "rm f",
+        "  delete %s" % tmpdir.join("f"),
+        "sh -c \"echo abc > f\"",
+        "  truncate file %s" % tmpdir.join("f"),
+        "  write 4 bytes to %s" % tmpdir.join("f"),
+        "touch g",
+        "  create file %s" % tmpdir.join("g"),
+        "",
+        "maybe has detected files touched by more than one command:",
+        "",
+        "  %s" % tmpdir.join("f"),
+        "    rm f: delete %s" % tmpdir.join("f"),
+        "    sh -c \"echo abc > f\": truncate file %s" % tmpdir.join("f"),
+        "    sh -c \"echo abc > f\": write 4 bytes to %s" % tmpdir.join("f"),
+    ]
+    assert tmpdir.join("f").read() == "abc"
+    assert not tmpdir.join("g").check()
@@ -0,0 +1,50 @@
+from maybe import cache_decisions
+from maybe.cache import DecisionCache, MISSING, CACHES, invalidate_decisions
+from maybe.operations import Operation
+
+
+def test_decision_cache():
+    cache = DecisionCache(2)
+    cache.put(("/a", 1), "a")
+    cache.put(("/b", 1), "b")
+    assert cache.get(("/a", 1)) == "a"
+    # Least recently used decision is evicted
+    cache.put(("/c", 1), "c")
+    assert cache.get(("/b", 1)) is MISSING
+    assert cache.get(("/a", 1)) == "a"
+    cache.invalidate("/")
+    assert len(cache) == 2
+    cache.invalidate("/", True)
+    assert len(cache) == 0
+    assert cache.stats() == {"size": 0, "max_size": 2, "hits": 2, "misses": 1, "evictions": 1, "invalidations": 2}
+
+
+def test_cache_decisions(tmpdir):
+    calls = []
+
+    @cache_decisions
+    def filter_file(path, flags):
+        calls.append(path)
+        return None, flags
+
+    try:
+        f = tmpdir.join("f")
+        f.write("abc")
+        assert filter_file(str(f), 1) == (None, 1)
+        assert filter_file(str(f), 1) == (None, 1)
+        assert filter_file(str(f), 2) == (None, 2)
+        assert len(calls) == 2
+        # Changed file
+        f.write("abcd")
+        filter_file(str(f), 1)
+        assert len(calls) == 3
+        # File touched by the command
+        invalidate_decisions(Operation("move", str(tmpdir), str(tmpdir) + "2"))
+        filter_file(str(f), 1)
+        assert len(calls) == 4
+        # Missing files are never cached
+        filter_file(str(tmpdir.join("g")), 1)
+        filter_file(str(tmpdir.join("g")), 1)
+        assert len(calls) == 6
+    finally:
+        CACHES.remove(filter_file.cache)
@@ -0,0 +1,39 @@
+import os
+import sys
+import time
+import subprocess
+
+from six import PY2
+import pytest
+
+
+@pytest.mark.skipif(PY2, reason="requires socket.sendmsg")
+def test_daemon(tmpdir):
+    socket_path = str(tmpdir.join("maybe.sock"))
+    # The subprocesses import maybe from this source tree
+    environment = dict(os.environ, MAYBE_DAEMON=socket_path,
+                       PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    daemon = subprocess.Popen([sys.executable, "-c", "from maybe.daemon import main; main()", socket_path],
+                              env=environment)
+    try:
+        for i in range(100):
+            if os.path.exists(socket_path):
+                break
+            time.sleep(0.1)
+
+        f = tmpdir.join("f")
+        f.write("abc")
+        output = subprocess.check_output([sys.executable, "-c", "import sys; from maybe.client import main; "
+                                          "sys.exit(main(sys.argv[1:]))", "-l", "--", "rm", "f"],
+                                         cwd=str(tmpdir), env=environment)
+        assert output.decode("utf-8").strip() == "delete %s" % f
+        assert f.check()
+
+        # The command runs with the umask of the client
+        output = subprocess.check_output([sys.executable, "-c", "import os, sys; from maybe.client import main; "
+                                          "os.umask(0o027); sys.exit(main(sys.argv[1:]))",
+                                          "-l", "--", "sh", "-c", "umask"], cwd=str(tmpdir), env=environment)
+        assert output.decode("utf-8").split("\n")[0] == "0027"
+    finally:
+        daemon.terminate()
+        daemon.wait()
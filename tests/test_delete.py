@@ -1,5 +1,14 @@
-from common import tf
+from common import tf, maybe, working_directory
 
 
 def test_delete_file(tmpdir):
     tf(tmpdir, "rm '{f}'", "delete {f}", "delete", lambda f: f.check())
+
+
+def test_delete_file_after_changing_directory(tmpdir):
+    f = tmpdir.join("filename")
+    f.write("abc")
+    tmpdir.mkdir("subdirectory")
+    with working_directory(tmpdir):
+        assert maybe("-l -- sh -c 'cd subdirectory && rm ../filename'") == "delete %s" % f
+    assert f.check()
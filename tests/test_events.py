@@ -0,0 +1,36 @@
+import json
+
+from maybe.maybe import main as maybe_main
+
+from common import maybe, working_directory
+
+
+def test_format_json(tmpdir):
+    tmpdir.join("f").write("abc")
+    with working_directory(tmpdir):
+        events = [json.loads(line) for line in maybe("--format json -- rm f").splitlines()]
+    # Syscalls are streamed while the command is running, followed by the operations
+    prevented = [event for event in events if event["event"] == "prevented"]
+    assert [(event["syscall"], event["operation"], event["return_value"]) for event in prevented] == \
+        [("unlinkat", {"kind": "delete", "path": str(tmpdir.join("f"))}, 0)]
+    assert events[-1] == {"event": "operation", "operation": {"kind": "delete", "path": str(tmpdir.join("f"))}}
+    assert all(event["event"] == "intercepted" for event in events[:-1] if event not in prevented)
+    assert tmpdir.join("f").check()
+
+
+def test_events_file(tmpdir):
+    tmpdir.join("f").write("abc")
+    with working_directory(tmpdir):
+        for mode in ["ptrace", "seccomp", "notify"]:
+            assert maybe("-l -m %s --events events -- mv f g" % mode) == \
+                "rename %s to g" % tmpdir.join("f")
+            events = [json.loads(line) for line in tmpdir.join("events").readlines()]
+            assert [event["operation"] for event in events if event["event"] == "prevented"] == \
+                [{"kind": "move", "path": str(tmpdir.join("f")), "target": str(tmpdir.join("g"))}]
+
+
+def test_events_write_error(tmpdir, capsys):
+    tmpdir.join("f").write("abc")
+    # Writing to /dev/full always fails
+    assert maybe_main(["-l", "--events", "/dev/full", "--", "rm", str(tmpdir.join("f"))]) == 1
+    assert "Error writing output" in capsys.readouterr().err
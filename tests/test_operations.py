@@ -0,0 +1,53 @@
+from maybe.operations import Operation, OperationLog, format_operation
+
+
+def create_file(path):
+    return Operation("create_file", path)
+
+
+def write(path, byte_count):
+    return Operation("write", path, byte_count=byte_count)
+
+
+def change_permissions(path, mode):
+    return Operation("change_permissions", path, mode=mode)
+
+
+def test_operations_are_combined():
+    operations = OperationLog()
+    operations.append(create_file("/a"))
+    operations.append(write("/b", 1))
+    for i in range(1000):
+        operations.append(write("/a", 4096))
+        operations.append(write("/b", 2))
+    operations.append(change_permissions("/a", 0o600))
+    operations.append(change_permissions("/b", 0o600))
+    operations.append(change_permissions("/b", 0o600))
+    operations.append("delete /b")
+    operations.append("delete /b")
+    assert [format_operation(operation) for operation in operations] == [
+        "create file /a with 4096000 bytes and permissions rw-------",
+        "write 2001 bytes to /b",
+        "change permissions of /b to rw-------",
+        "delete /b",
+    ]
+
+
+def test_writes_after_other_operations_are_not_merged():
+    operations = OperationLog()
+    operations.append(write("/a", 1))
+    operations.append(change_permissions("/a", 0o600))
+    operations.append(write("/a", 1))
+    assert len(operations) == 3
+
+
+def test_operations_are_spilled():
+    operations = OperationLog(10)
+    operations.append(write("/a", 1))
+    for i in range(25):
+        operations.append(Operation("delete", "/%d" % i))
+    # Operations are not combined with operations that have been spilled
+    operations.append(write("/a", 1))
+    assert len(operations) == 27
+    assert [operation.path for operation in operations] == ["/a"] + ["/%d" % i for i in range(25)] + ["/a"]
+    operations.close()
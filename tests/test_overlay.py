@@ -0,0 +1,15 @@
+from common import maybe, working_directory
+
+
+def test_overlay(tmpdir, monkeypatch):
+    monkeypatch.setattr("maybe.maybe.input", lambda: "n")
+    with working_directory(tmpdir):
+        maybe("-o -- sh -c \"echo abc > f; cat f > g; mkdir d; mv f d/f\"")
+    assert tmpdir.listdir() == []
+
+    monkeypatch.setattr("maybe.maybe.input", lambda: "y")
+    with working_directory(tmpdir):
+        maybe("-o -- sh -c \"echo abc > f; cat f > g; mkdir d; mv f d/f\"")
+    assert tmpdir.join("d", "f").read() == "abc\n"
+    assert tmpdir.join("g").read() == "abc\n"
+    assert not tmpdir.join("f").check()
@@ -0,0 +1,39 @@
+from common import maybe
+from maybe import SYSCALL_FILTERS
+
+
+PLUGIN = """
+from maybe import register_filter
+
+register_filter("unlinkat", lambda process, args: ("%s " + process.full_path(args[1], args[0]), 0), "plugin")
+"""
+
+
+def test_plugin(tmpdir, monkeypatch):
+    monkeypatch.setattr("maybe.plugins.PLUGIN_CACHE_DIRECTORY", str(tmpdir.join("cache")))
+    compilations = []
+
+    def compile_plugin(*args, **kwargs):
+        compilations.append(args[1])
+        return compile(*args, **kwargs)
+    monkeypatch.setattr("maybe.plugins.compile", compile_plugin, raising=False)
+    monkeypatch.setitem(SYSCALL_FILTERS, "plugin", {})
+
+    plugin = tmpdir.join("plugin.py")
+    plugin.write(PLUGIN % "remove")
+    f = tmpdir.join("f")
+    f.write("abc")
+
+    # Filters registered by plugins take precedence over the built-in ones for the same syscalls
+    assert maybe("-l -p %s -- rm %s" % (plugin, f)) == "remove %s" % f
+    assert len(tmpdir.join("cache").listdir()) == 1
+    assert compilations == [str(plugin)]
+
+    # Unchanged plugins are not compiled again
+    assert maybe("-l -p %s -- rm %s" % (plugin, f)) == "remove %s" % f
+    assert compilations == [str(plugin)]
+
+    plugin.write(PLUGIN % "erase something longer")
+    assert maybe("-l -p %s -- rm %s" % (plugin, f)) == "erase something longer %s" % f
+    assert compilations == [str(plugin)] * 2
+    assert f.check()
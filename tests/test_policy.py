@@ -0,0 +1,37 @@
+from maybe.policy import Policy, translate_glob
+
+from common import maybe, working_directory
+
+
+def test_translate_glob():
+    assert translate_glob("/a/*.txt") == r"/a/[^/]*\.txt"
+    assert translate_glob("/a/**") == "/a/.*"
+    assert translate_glob("/a/[!b]?") == "/a/[^b][^/]"
+
+
+def test_policy(tmpdir):
+    policy_file = tmpdir.join("policy")
+    policy_file.write("# comment\n\ndeny * /tmp/keep\nallow delete /tmp/** /var/*.log\n")
+    policy = Policy()
+    policy.load(str(policy_file), ["delete", "move"])
+    assert policy.allows("delete", "/tmp/a/b")
+    assert policy.allows("delete", "/var/a.log")
+    assert not policy.allows("delete", "/var/a/b.log")
+    # First matching rule decides
+    assert not policy.allows("delete", "/tmp/keep")
+    assert not policy.allows("move", "/tmp/a")
+
+
+def test_policy_file(tmpdir):
+    tmpdir.join("policy").write("allow create_write_file build/**\nallow delete build/*\n")
+    tmpdir.mkdir("build").join("f").write("abc")
+    tmpdir.join("g").write("abc")
+    with working_directory(tmpdir):
+        assert maybe("-l --policy policy -- sh -c \"echo abc > build/h; echo abc > i; rm build/f g\"") == "\n".join([
+            "create file %s with 4 bytes" % tmpdir.join("i"),
+            "delete %s" % tmpdir.join("g"),
+        ])
+    assert tmpdir.join("build", "h").read() == "abc\n"
+    assert not tmpdir.join("build", "f").check()
+    assert not tmpdir.join("i").check()
+    assert tmpdir.join("g").check()
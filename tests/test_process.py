@@ -0,0 +1,110 @@
+import subprocess
+from os import getpid, symlink
+from mmap import mmap, PAGESIZE
+from collections import namedtuple
+from ctypes import CDLL, c_char, c_void_p, c_size_t, addressof
+
+import pytest
+
+from maybe.process import Process, DescriptorTable, start_time
+from maybe.arguments import BadAddress
+
+
+# Stands in for the process objects of python-ptrace, of which read_string only uses the PID
+Tracee = namedtuple("Tracee", ["pid"])
+
+# Not in the mmap module before Python 3.13
+PROT_NONE = 0
+
+
+def test_fake_descriptors_are_recycled():
+    process = Process(None)
+    first = process.register_path("/a")
+    second = process.register_path("/b")
+    assert first == DescriptorTable.FIRST_FAKE_DESCRIPTOR
+    assert second == first + 1
+    process.close_descriptor(first)
+    assert not process.is_tracked_descriptor(first)
+    assert process.register_path("/c") == first
+    assert process.descriptor_path(first) == "/c"
+
+
+def test_descriptor_table_is_copied_on_write():
+    parent = Process(None)
+    file_descriptor = parent.register_path("/a")
+    child = parent.fork(None)
+    assert child._descriptors is parent._descriptors
+    child.close_descriptor(file_descriptor)
+    assert not child.is_tracked_descriptor(file_descriptor)
+    assert parent.descriptor_path(file_descriptor) == "/a"
+
+
+def test_close_on_exec():
+    process = Process(None)
+    kept = process.register_path("/a")
+    closed = process.register_path("/b", close_on_exec=True)
+    process.execute()
+    assert process.is_tracked_descriptor(kept)
+    assert not process.is_tracked_descriptor(closed)
+
+
+def test_exited_process_releases_descriptor_table():
+    parent = Process(None)
+    file_descriptor = parent.register_path("/a")
+    child = parent.fork(None)
+    parent.add_thread()
+    assert not parent.remove_thread()
+    assert parent.remove_thread()
+    # The table is no longer shared, so it doesn't have to be copied
+    child.close_descriptor(file_descriptor)
+    assert child._descriptors is parent._descriptors
+
+
+def memory(pages):
+    buffer = mmap(-1, pages * PAGESIZE)
+    return buffer, addressof(c_char.from_buffer(buffer))
+
+
+# Strings are read from the memory of this process, as they would be from that of a traced one
+
+def test_read_string_across_pages():
+    process = Process(Tracee(getpid()))
+    buffer, address = memory(4)
+    buffer[PAGESIZE - 4:PAGESIZE + 5] = b"/path/to\0"
+    assert process.read_string(address + PAGESIZE - 4) == "/path/to"
+    # Longer than a page, which used to be the limit
+    path = b"/" + b"d/" * (PAGESIZE + 100)
+    buffer[10:10 + len(path) + 1] = path + b"\0"
+    assert process.read_string(address + 10) == path.decode("ascii")
+
+
+def test_read_string_before_unreadable_memory():
+    process = Process(Tracee(getpid()))
+    buffer, address = memory(2)
+    libc = CDLL(None, use_errno=True)
+    assert libc.mprotect(c_void_p(address + PAGESIZE), c_size_t(PAGESIZE), PROT_NONE) == 0
+    buffer[PAGESIZE - 4:PAGESIZE] = b"/ab\0"
+    assert process.read_string(address + PAGESIZE - 4) == "/ab"
+    # Unterminated strings aren't taken to end where memory becomes unreadable
+    buffer[PAGESIZE - 4:PAGESIZE] = b"/abc"
+    with pytest.raises(BadAddress):
+        process.read_string(address + PAGESIZE - 4)
+
+
+def test_read_string_from_null_pointer():
+    process = Process(Tracee(getpid()))
+    with pytest.raises(BadAddress):
+        process.read_string(0)
+
+
+def test_start_time(tmpdir):
+    # Command names can contain spaces and parentheses
+    command = str(tmpdir.join("a ) b"))
+    symlink("/bin/sleep", command)
+    process = subprocess.Popen([command, "10"])
+    try:
+        assert start_time(process.pid) >= start_time(getpid())
+        assert start_time(process.pid) == start_time(process.pid)
+    finally:
+        process.kill()
+        process.wait()
@@ -0,0 +1,30 @@
+from maybe.record import Recording, INDEX_TRAILER
+
+from common import maybe, working_directory
+
+
+def test_record(tmpdir):
+    tmpdir.mkdir("d").join("f").write("abc")
+    tmpdir.join("g").write("abc")
+    with working_directory(tmpdir):
+        maybe("-l --record recording -- sh -c \"rm d/f g; mv d e\"")
+        assert maybe("report --style-output no --group-by operation --prevented recording").splitlines() == [
+            "       2 delete",
+            "       1 move",
+        ]
+        assert [line.split("  ")[1] for line in maybe("report --style-output no --path d recording").splitlines()] \
+            == ["move %s -> %s" % (tmpdir.join("d"), tmpdir.join("e")), "delete %s" % tmpdir.join("d", "f")]
+
+    recording = Recording(str(tmpdir.join("recording")))
+    assert recording.indexed
+    paths = [record.path for record in recording.records_below(str(tmpdir.join("d")))]
+    recording.close()
+
+    # Recordings that haven't been closed have no index
+    data = tmpdir.join("recording").read_binary()
+    tmpdir.join("recording").write_binary(data[:-INDEX_TRAILER.size])
+    recording = Recording(str(tmpdir.join("recording")))
+    assert not recording.indexed
+    assert sorted(record.path for record in recording.records_below(str(tmpdir.join("d")))) == sorted(paths)
+    assert [record.kind for record in recording if record.kind is not None] == ["delete", "delete", "move"]
+    recording.close()
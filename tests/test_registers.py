@@ -0,0 +1,44 @@
+from errno import EIO, ESRCH
+
+import pytest
+from ptrace import PtraceError
+
+from maybe import registers
+from maybe.registers import Registers
+
+from common import tf, maybe, working_directory
+
+
+# Kernels older than 5.3 don't support PTRACE_GET_SYSCALL_INFO
+
+def test_delete_file_without_syscall_info(tmpdir, monkeypatch):
+    monkeypatch.setattr("maybe.registers._syscall_info_available", False)
+    tf(tmpdir, "rm '{f}'", "delete {f}", "delete", lambda f: f.check())
+
+
+def test_overlay_without_syscall_info(tmpdir, monkeypatch):
+    monkeypatch.setattr("maybe.registers._syscall_info_available", False)
+    monkeypatch.setattr("maybe.maybe.input", lambda: "y")
+    with working_directory(tmpdir):
+        maybe("-o -- sh -c \"echo abc > f; cat f > g\"")
+    assert tmpdir.join("g").read() == "abc\n"
+
+
+class FellBack(Exception):
+    pass
+
+
+@pytest.mark.parametrize("errno, available", [(EIO, False), (ESRCH, True)])
+def test_syscall_info_errors(monkeypatch, errno, available):
+    def ptrace(*args):
+        raise PtraceError("ptrace failed", errno=errno)
+
+    def ptrace_getregs(pid):
+        raise FellBack()
+    monkeypatch.setattr("maybe.registers.ptrace", ptrace)
+    monkeypatch.setattr("maybe.registers.ptrace_getregs", ptrace_getregs)
+    monkeypatch.setattr("maybe.registers._syscall_info_available", True)
+    # Only old kernels make maybe fall back to PTRACE_GETREGS, not e.g. a thread that has been killed
+    with pytest.raises(PtraceError if available else FellBack):
+        Registers(1).syscall()
+    assert registers._syscall_info_available == available
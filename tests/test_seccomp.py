@@ -0,0 +1,79 @@
+import sys
+import platform
+
+import pytest
+
+from common import tf, maybe, working_directory
+
+
+def test_delete_file(tmpdir):
+    tf(tmpdir, "rm '{f}'", "delete {f}", "delete", lambda f: f.check(), "-m seccomp")
+
+
+def test_change_permissions_file(tmpdir):
+    tf(tmpdir, "chmod 600 '{f}'", "change permissions of {f} to rw-------",
+       "change_permissions", lambda f: f.stat().mode & 0o777 != 0o600, "-m seccomp")
+
+
+def test_delete_file_notify(tmpdir):
+    tf(tmpdir, "rm '{f}'", "delete {f}", "delete", lambda f: f.check(), "-m notify")
+
+
+def test_change_permissions_file_notify(tmpdir):
+    tf(tmpdir, "chmod 600 '{f}'", "change permissions of {f} to rw-------",
+       "change_permissions", lambda f: f.stat().mode & 0o777 != 0o600, "-m notify")
+
+
+def test_filter_only_needed_trackers(monkeypatch):
+    from maybe import SYSCALL_FILTERS
+    from maybe.process import DIRECTORY_TRACKERS
+    from maybe.seccomp import compile_filter
+    compiled = []
+
+    def compile_syscalls(syscalls, *args):
+        compiled.append(set(syscalls))
+        return compile_filter(syscalls, *args)
+    monkeypatch.setattr("maybe.seccomp.compile_filter", compile_syscalls)
+
+    for mode in ["seccomp", "notify"]:
+        maybe("-l -m %s -a create_write_file -- true" % mode)
+    # Without filters returning fake file descriptors, syscalls like close, dup and fcntl aren't stopped at
+    filtered = set(syscall for scope in SYSCALL_FILTERS if scope != "create_write_file"
+                   for syscall in SYSCALL_FILTERS[scope])
+    assert compiled == [filtered | set(DIRECTORY_TRACKERS)] * 2
+
+
+def test_notify_requires_sendmsg(monkeypatch):
+    # Like the socket module of Python 2
+    class socket_module(object):
+        socket = object
+    monkeypatch.setattr("maybe.maybe.socket", socket_module)
+    assert maybe("-l -m notify -- true") == "Notify mode requires Python 3."
+
+
+def test_fork_inherits_descriptors_notify(tmpdir):
+    script = ("import os\n"
+              "fd = os.open('f', os.O_WRONLY | os.O_CREAT)\n"
+              "if os.fork() == 0:\n"
+              "    os.write(fd, b'abc')\n"
+              "    os._exit(0)\n"
+              "os.wait()\n")
+    with working_directory(tmpdir):
+        # The write of the child goes to the file descriptor the parent has been given in place of a real one
+        assert maybe("-l -m notify -- %s -c \"%s\"" % (sys.executable, script)) == \
+            "create file %s with 3 bytes" % tmpdir.join("f")
+    assert not tmpdir.join("f").check()
+
+
+@pytest.mark.skipif(platform.machine() != "x86_64", reason="x32 is an x86_64 ABI")
+def test_foreign_abi(tmpdir):
+    # Syscalls made through the x32 ABI can't be checked by the filters, so they always fail
+    f = tmpdir.join("f")
+    f.write("abc")
+    script = ("import ctypes, errno\n"
+              "libc = ctypes.CDLL(None, use_errno=True)\n"
+              "assert libc.syscall(0x40000000 | 87, b'%s') == -1 and ctypes.get_errno() == errno.ENOSYS\n" % f)
+    for mode in ["seccomp", "notify"]:
+        assert maybe("-l -m %s -- %s -c \"%s\"" % (mode, sys.executable, script)) == \
+            "maybe has not detected any file system operations from %s -c '%s'." % (sys.executable, script)
+        assert f.check()
@@ -0,0 +1,67 @@
+from os import stat
+from stat import S_ISDIR
+
+from maybe.operations import Operation
+from maybe.shadow import ShadowFilesystem
+
+from common import maybe, working_directory
+
+
+def test_shadow_filesystem(tmpdir):
+    tmpdir.mkdir("directory").join("file").write("abc")
+    directory = str(tmpdir.join("directory"))
+    filesystem = ShadowFilesystem()
+    assert S_ISDIR(filesystem.mode(directory))
+    assert filesystem.exists(directory + "/file")
+    assert not filesystem.exists(directory + "/file/file")
+
+    filesystem.update(Operation("move", directory, str(tmpdir.join("moved"))))
+    assert not filesystem.exists(directory)
+    assert not filesystem.exists(directory + "/file")
+    # Found at its old location
+    assert filesystem.exists(str(tmpdir.join("moved", "file")))
+
+    filesystem.update(Operation("create_directory", directory))
+    assert S_ISDIR(filesystem.mode(directory))
+    assert not filesystem.exists(directory + "/file")
+    filesystem.update(Operation("create_file", directory + "/file", mode=0o600))
+    assert filesystem.mode(directory + "/file") & 0o777 == 0o600
+
+    filesystem.update(Operation("delete", str(tmpdir)))
+    assert not filesystem.exists(directory)
+    assert tmpdir.join("directory", "file").check()
+
+
+def test_executed_syscalls_are_seen(tmpdir):
+    tmpdir.join("f").write("abc")
+    with working_directory(tmpdir):
+        # The file is really deleted, so it is created rather than truncated afterwards
+        assert maybe("-l -a delete -- sh -c \"echo > f; rm f; echo > f\"").splitlines()[-1] == \
+            "create file %s with 1 bytes" % tmpdir.join("f")
+    assert not tmpdir.join("f").check()
+
+
+def test_caching(tmpdir, monkeypatch):
+    stats = []
+
+    def counting_stat(path):
+        stats.append(path)
+        return stat(path)
+    monkeypatch.setattr("maybe.shadow.stat", counting_stat)
+    f = str(tmpdir.join("f"))
+    filesystem = ShadowFilesystem()
+    filesystem.clear(True)
+    for i in range(3):
+        assert not filesystem.exists(f)
+    assert stats == [f]
+    # Forgotten before the command is allowed to create the file
+    filesystem.forget(f)
+    tmpdir.join("f").write("abc")
+    assert filesystem.exists(f)
+    assert stats == [f, f]
+
+    # Without caching, changes made by syscalls that are let through are seen
+    filesystem.clear()
+    assert filesystem.exists(f)
+    tmpdir.join("f").remove()
+    assert not filesystem.exists(f)
@@ -0,0 +1,22 @@
+import json
+
+from maybe import STATS
+
+from common import maybe
+
+
+def test_stats(tmpdir):
+    f = tmpdir.join("f")
+    f.write("abc")
+    try:
+        output = maybe("-l --stats=json -- rm %s" % f)
+    finally:
+        STATS.enabled = False
+    operation, stats = output.split("\n", 1)
+    assert operation == "delete %s" % f
+    stats = json.loads(stats)
+    assert stats["syscalls"]["unlinkat"] == {"intercepted": 1, "prevented": 1, "passed": 0}
+    assert stats["filters"]["maybe.filters.delete:unlinkat"]["calls"] == 1
+    assert stats["stops"]["unlinkat"] == 1
+    assert sum(stats["stops"].values()) >= sum(syscall["intercepted"] for syscall in stats["syscalls"].values())
+    assert f.check()
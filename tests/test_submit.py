@@ -0,0 +1,30 @@
+from time import sleep, time
+
+import pytest
+
+from maybe import SYSCALL_FILTERS, submit
+
+from common import maybe, working_directory
+
+
+def slow_delete(path):
+    sleep(1)
+    return "slowly delete %s" % path, 0
+
+
+@pytest.mark.parametrize("mode", ["ptrace", "seccomp", "notify"])
+def test_submit(tmpdir, monkeypatch, mode):
+    monkeypatch.setitem(SYSCALL_FILTERS, "slow_delete", {
+        "unlink": lambda process, args: submit(slow_delete, args[0]),
+        "unlinkat": lambda process, args: submit(slow_delete, args[1]),
+    })
+    tmpdir.join("a").write("abc")
+    tmpdir.join("b").write("abc")
+    with working_directory(tmpdir):
+        start = time()
+        output = maybe("-l -m %s -- sh -c \"rm a & rm b & wait\"" % mode)
+        # Both decisions are made at the same time
+        assert time() - start < 1.9
+    assert sorted(output.splitlines()) == ["slowly delete a", "slowly delete b"]
+    assert tmpdir.join("a").check()
+    assert tmpdir.join("b").check()
@@ -0,0 +1,49 @@
+import sys
+
+import pytest
+
+from common import maybe, working_directory
+
+
+@pytest.mark.parametrize("mode", ["ptrace", "seccomp"])
+def test_processes(tmpdir, mode):
+    with working_directory(tmpdir):
+        output = maybe("-l -m %s -- sh -c \"for i in 1 2 3; do (mkdir d$i) & done; wait\"" % mode)
+    assert sorted(output.split("\n")) == ["create directory %s" % tmpdir.join("d%d" % i) for i in range(1, 4)]
+    assert tmpdir.listdir() == []
+
+
+@pytest.mark.parametrize("mode", ["ptrace", "seccomp"])
+def test_execution_by_thread(tmpdir, mode):
+    # The thread calling execve is not the thread group leader
+    script = ("import os, threading, time; "
+              "threading.Thread(target=lambda: os.execv('/bin/mkdir', ['mkdir', 'd'])).start(); time.sleep(10)")
+    with working_directory(tmpdir):
+        output = maybe("-l -m %s -- %s -c \"%s\"" % (mode, sys.executable, script))
+    assert output == "create directory %s" % tmpdir.join("d")
+    assert tmpdir.listdir() == []
+
+
+@pytest.mark.parametrize("mode", ["ptrace", "seccomp"])
+def test_fchdir_to_bad_descriptor(tmpdir, mode):
+    script = ("import os, errno\n"
+              "try: os.fchdir(9999)\n"
+              "except OSError as error: assert error.errno == errno.EBADF\n"
+              "os.mkdir('d')")
+    with working_directory(tmpdir):
+        output = maybe("-l -m %s -- %s -c \"%s\"" % (mode, sys.executable, script))
+    assert output == "create directory %s" % tmpdir.join("d")
+    assert tmpdir.listdir() == []
+
+
+@pytest.mark.parametrize("mode", ["ptrace", "seccomp"])
+def test_null_path(tmpdir, mode):
+    # Failed with EFAULT, like the kernel does
+    script = ("import ctypes, errno\n"
+              "libc = ctypes.CDLL(None, use_errno=True)\n"
+              "assert libc.unlink(None) == -1 and ctypes.get_errno() == errno.EFAULT\n"
+              "libc.mkdir(b'd', 0o777)")
+    with working_directory(tmpdir):
+        output = maybe("-l -m %s -- %s -c \"%s\"" % (mode, sys.executable, script))
+    assert output == "create directory %s" % tmpdir.join("d")
+    assert tmpdir.listdir() == []